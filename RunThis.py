@@ -1,74 +1,106 @@
+import time
+_T_START = time.perf_counter()  # startup report baseline
 import tkinter as tk
 from tkinter import ttk
 import cv2
 import numpy as np
 from PIL import Image, ImageTk
 from monitor import Monitor  # Assuming monitor.py is in the same directory
-# Assuming email_sender.py is in the same directory
-from email_sender import send_alert_email
+from mask_engine import DirectSession, ModelLoader
+from capture import CaptureThread
+from inference_worker import AdaptiveRate, InferenceWorker, RateCounter
+from motion_gate import MotionGate
+from regions import Region, bounds
+from alerts import AlertDispatcher
+from frame_ring import FrameRing, encode_gif
+from diff_log import DiffLogger
+from metrics import JsonLogExporter, Metrics, PrometheusExporter
+from filament_watcher import FilamentWatcher
+from printer_io import FILAMENT_SENSOR_PIN, PRINTER_PAUSE_PIN, create_driver
 import datetime
+import os
 
 # --- Configuration ---
 CANVAS_W = 410
+# Named regions in canvas pixels, each optionally with its own sensitivity
+# and consecutive_threshold; "exclude": True marks a zone to ignore, e.g.
+# [{"name": "part", "rect": (150, 80, 120, 90), "sensitivity": 25},
+#  {"name": "bed_edge", "rect": (20, 200, 370, 40)},
+#  {"name": "toolhead", "rect": (150, 40, 120, 40), "exclude": True}]
+# Shift-drag on the preview adds a region, right-drag an exclusion zone.
+REGIONS = None
+CAMERA_INDEX = 0  # or a device path / stream URL
+CAMERA_WIDTH = None  # e.g. 1280; None keeps the driver default
+CAMERA_HEIGHT = None  # e.g. 720
+CAMERA_FPS = None  # e.g. 15
+CAMERA_FOURCC = None  # "MJPG" saves USB bandwidth and CPU on most webcams, "YUYV" is raw
+CAMERA_BUFFERSIZE = 1  # frames queued in the driver; 1 keeps them fresh
 BLEND_ALPHA = 0.4
 sensitivity = 30  # Initial sensitivity
 consecutive_threshold = 3
 MINT_BGR = (201, 252, 157)
 ALERT_BGR = (0, 0, 255)
 BOX_THICKNESS = 4
-
-# --- GPIO and Filament Sensor Setup ---
-FILAMENT_SENSOR_PIN = 22
-PRINTER_PAUSE_PIN = 17
-
-GPIO_AVAILABLE = False
-try:
-    import RPi.GPIO as GPIO
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(PRINTER_PAUSE_PIN, GPIO.OUT)
-    GPIO.setup(FILAMENT_SENSOR_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-    GPIO_AVAILABLE = True
-    print("RPi.GPIO initialized successfully.")
-
-    def set_printer_state_hw(run_printer: bool):
-        if run_printer:
-            GPIO.output(PRINTER_PAUSE_PIN, GPIO.LOW)
-            print(
-                f"GPIO {PRINTER_PAUSE_PIN} set to LOW (0 V) - Printer Running")
-        else:
-            GPIO.output(PRINTER_PAUSE_PIN, GPIO.HIGH)
-            print(f"GPIO {PRINTER_PAUSE_PIN} set to HIGH - Printer Paused")
-
-    def is_filament_present_hw():
-        return GPIO.input(FILAMENT_SENSOR_PIN) == GPIO.LOW
-
-except ImportError:
-    print("RPi.GPIO not found. Running in simulation mode for GPIO.")
-
-    def set_printer_state_hw(run_printer: bool):
-        if run_printer:
-            print(
-                f"SIMULATE: GPIO {PRINTER_PAUSE_PIN} set to LOW (0 V) - Printer Running")
-        else:
-            print(
-                f"SIMULATE: GPIO {PRINTER_PAUSE_PIN} set to HIGH - Printer Paused")
-
-    def is_filament_present_hw():
-        return True
+MODEL_NAME = "u2netp"
+MASK_BACKEND = "rembg"  # "onnx" runs the model on ONNX Runtime without PIL
+PRECISION = "fp32"  # "fp16", "int8" or "int8-static" after quantize_models.py (onnx only)
+ROI_ONLY = False  # segment only the ROI instead of the whole frame
+ROI_PADDING = 16  # pixels of context around the ROI for the model
+INFER_SCALE = 1.0  # e.g. 0.5 to run the model on a half-size image
+MOTION_GATE = False  # reuse the last mask while the ROI is static
+MOTION_THRESHOLD = 2.0  # mean grey-level change that counts as motion
+MOTION_MAX_SKIP = 10  # run the model at least every N frames anyway
+MASK_EMA = None  # e.g. 0.5 to average masks over time against flicker
+BASELINE_EMA = None  # e.g. 0.2 to move the baseline gradually on normal frames; single ROI only
+MASK_OPEN = 0  # e.g. 3 to clear specks and pinholes from each mask
+DISPLAY_FPS = 20  # preview refresh target; the loop subtracts its own cost
+DETECT_FPS = 5.0  # detection rate ceiling
+CPU_BUDGET = None  # e.g. 0.5 to keep detection within half a core
+MIN_DETECT_FPS = 0.5  # floor after a long stable stretch
+STABLE_AFTER = 60  # seconds of low diff before the detection rate backs off
+RING_SECONDS = 10  # pre-alert clip length attached to motion alert emails
+RING_FPS = 4  # clip frame rate; memory is RING_SECONDS * RING_FPS slots
+DIFF_LOG_DIR = "diff_logs"  # per-frame dp/db history for tuning; None to disable
+DISPLAY_STATS_INTERVAL = 600  # seconds between display CPU/memory reports
+METRICS = False  # per-stage timings and counters; off costs nothing per frame
+METRICS_PORT = 9108  # Prometheus /metrics on localhost; None to disable
+METRICS_LOG = "monitor_metrics.jsonl"  # periodic JSON snapshots; None to disable
+METRICS_LOG_INTERVAL = 60  # seconds
+GPIO_DRIVER = "auto"  # "rpi", "gpiozero" (e.g. Pi 5) or "simulated"
+FILAMENT_DEBOUNCE = 0.05  # seconds the sensor must hold a level to count
+
+
+def _rss_mb():
+    # current resident set size; falls back to the peak where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 
 class App:
     def __init__(self, root):
+        t_init = time.perf_counter()
+        # the model loads and warms up while the window and camera come up
+        self.loader = ModelLoader(MASK_BACKEND, MODEL_NAME,
+                                  precision=PRECISION).start()
         self.root = root
         root.title("Live Extraction & Printer Monitor")
         root.geometry("480x800")
         root.resizable(False, False)
 
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            raise RuntimeError("Cannot open camera")
-        fw = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        fh = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # the camera is read on its own thread; update_frame takes the
+        # newest frame and its capture time
+        self.capture = CaptureThread(CAMERA_INDEX, CAMERA_WIDTH,
+                                     CAMERA_HEIGHT, CAMERA_FPS, CAMERA_FOURCC,
+                                     CAMERA_BUFFERSIZE)
+        fw, fh = self.capture.open()
+        print(f"Camera: {self.capture.describe()}")
+        self.capture.start()
+        self._frame_seq = None
 
         self.CANVAS_H = int(CANVAS_W * fh / fw)
         self.sx = fw / CANVAS_W
@@ -94,13 +126,24 @@ class App:
             root, text="-", command=self.decrease_sensitivity, style='Custom.TButton')
         self.decrease_btn.place(x=310, y=300, width=50, height=50)
 
-        initial_filament_status = "Filament: Initializing..." if GPIO_AVAILABLE else "Filament: N/A (No GPIO)"
+        # --- GPIO and Filament Sensor Setup ---
+        self.gpio = create_driver(GPIO_DRIVER)
+        self.gpio.setup_output(PRINTER_PAUSE_PIN)
+        # the sensor is watched on its own thread, which pauses the printer
+        # on a run-out itself; the GUI only hears about changes
+        self.filament = None
+        if not self.gpio.simulated:
+            self.filament = FilamentWatcher(
+                self.gpio, FILAMENT_SENSOR_PIN, PRINTER_PAUSE_PIN,
+                FILAMENT_DEBOUNCE).start()
+        initial_filament_status = "Filament: Not Tracking" if self.filament else "Filament: N/A (No GPIO)"
         self.filament_status_label = tk.Label(
             root, text=initial_filament_status, font=('TkDefaultFont', 16))
         self.filament_status_label.place(x=35, y=self.CANVAS_H + 25)
 
         self.start_btn = ttk.Button(
-            root, text="Start Monitoring", command=self.toggle_running, style='Custom.TButton')
+            root, text="Loading model...", command=self.toggle_running,
+            style='Custom.TButton', state="disabled")
         self.start_btn.place(x=15, y=370, width=450, height=180)
 
         self.pause_btn = ttk.Button(
@@ -115,27 +158,141 @@ class App:
         self.canvas.bind("<ButtonPress-1>", self.on_mouse_down)
         self.canvas.bind("<B1-Motion>", self.on_mouse_move)
         self.canvas.bind("<ButtonRelease-1>", self.on_mouse_up)
+        self.canvas.bind("<ButtonPress-3>", self.on_mouse_down)
+        self.canvas.bind("<B3-Motion>", self.on_mouse_move)
+        self.canvas.bind("<ButtonRelease-3>", self.on_mouse_up)
 
         self.drawing = False
+        self.draw_mode = "roi"  # "roi", "include" or "exclude"
         self.ix = self.iy = self.fx = self.fy = 0
         self.roi_canvas = (0, 0, 0, 0)
         self.roi_defined = False
+        # with regions, the ROI is their bounding box
+        self.regions = [Region.from_config(c) for c in REGIONS or ()]
+        if any(not r.exclude for r in self.regions):
+            self.roi_canvas = bounds(
+                [r.rect for r in self.regions if not r.exclude])
+            self.roi_defined = True
+        # shown on the preview while stopped, e.g. why a region was refused
+        self.status_text = self._regions_error()
         self.running = False
         self.printer_paused_by_user = False
         self.printer_paused_by_filament = False
         self.filament_alert_email_sent = False
+        self.filament_state = -1  # 1 present, 0 ran out, -1 not tracked
+        self.diff_log = DiffLogger(DIFF_LOG_DIR) if DIFF_LOG_DIR else None
 
         # Email credentials
         self.sender_email = None
         self.sender_password = None
         self.recipient_email = None
-
-        self.monitor = Monitor(sensitivity, consecutive_threshold,
-                               BLEND_ALPHA, MINT_BGR, ALERT_BGR, BOX_THICKNESS)
+        # alert emails are sent from a background thread
+        self.alerts = AlertDispatcher()
+        self.alerts.start()
+
+        # Monitor and worker are created once the model is ready
+        self.monitor = None
+        self.worker = None
+        self.increase_btn.config(state="disabled")
+        self.decrease_btn.config(state="disabled")
+        self.display_rate = RateCounter()
+        # how often frames go to the detector, from its measured cost
+        self.detect_rate = AdaptiveRate(DETECT_FPS, CPU_BUDGET,
+                                        MIN_DETECT_FPS, STABLE_AFTER)
+        self.db = 0
+        # recent canvas-size frames and masks for the pre-alert clip
+        self.ring = FrameRing(RING_SECONDS, RING_FPS)
+        self.metrics = None
+        self._exporters = []
         self._apply_printer_pause_state()
-        self.photo = None
+        # The frame is scaled down once into a canvas-size buffer and drawn
+        # on at canvas resolution; one PhotoImage and one canvas item are
+        # reused for the whole run.
+        self._canvas_bgr = np.empty((self.CANVAS_H, CANVAS_W, 3), np.uint8)
+        self._canvas_rgb = np.empty_like(self._canvas_bgr)
+        self.photo = ImageTk.PhotoImage("RGB", (CANVAS_W, self.CANVAS_H))
+        self.canvas_image = self.canvas.create_image(
+            0, 0, image=self.photo, anchor="nw")
+        self._display_s = 0.0
+        self._display_frames = 0
+        self._frames_displayed = 0
+        self._stats_wall = time.monotonic()
+        self._stats_cpu = time.process_time()
+        self._t_init = t_init
+        self._t_gui = time.perf_counter()
         self.update_frame()
 
+    def _on_model_ready(self):
+        loader, self.loader = self.loader, None
+        if loader.error is not None:
+            print(f"Error loading model '{MODEL_NAME}': {loader.error}")
+            self.start_btn.config(text="Model failed to load")
+            return
+        motion_gate = MotionGate(MOTION_THRESHOLD, MOTION_MAX_SKIP) \
+            if MOTION_GATE else None
+        self.monitor = Monitor(sensitivity, consecutive_threshold,
+                               BLEND_ALPHA, MINT_BGR, ALERT_BGR, BOX_THICKNESS,
+                               roi_only=ROI_ONLY, roi_padding=ROI_PADDING,
+                               motion_gate=motion_gate, engine=loader.engine,
+                               measure_full_frame=ROI_ONLY,
+                               infer_scale=INFER_SCALE, mask_ema=MASK_EMA,
+                               baseline_ema=BASELINE_EMA, mask_open=MASK_OPEN)
+        # Inference runs off the Tk thread; the GUI only submits frames
+        on_result = self._log_result if self.diff_log is not None else None
+        self.worker = InferenceWorker(self.monitor, on_result)
+        self.worker.start()
+        if METRICS:
+            self._start_metrics()
+        self.start_btn.config(text="Start Monitoring", state="normal")
+        self.increase_btn.config(state="normal")
+        self.decrease_btn.config(state="normal")
+
+        now = time.perf_counter()
+        session = loader.engine.session
+        source = os.path.basename(session.path) \
+            if isinstance(session, DirectSession) else "rembg"
+        print(f"Startup: imports {self._t_init - _T_START:.2f} s, "
+              f"window and camera {self._t_gui - self._t_init:.2f} s, "
+              f"model load {loader.load_s:.2f} s ({source}), "
+              f"warm-up inference {loader.warmup_s:.2f} s; "
+              f"Start available {now - _T_START:.2f} s after launch")
+
+    def _log_result(self, monitor, alert_triggered, db):
+        # runs on the inference thread for every analysed frame
+        self.diff_log.append(time.time(), monitor.dp, db,
+                             monitor.abnormal_count, monitor.alert,
+                             self.filament_state)
+
+    def _start_metrics(self):
+        metrics = self.metrics = Metrics()
+        self.monitor.profiler = metrics
+        metrics.add_collector(lambda: {
+            "frames_captured_total": self.capture.frames,
+            "frames_displayed_total": self._frames_displayed,
+            "camera_read_errors_total": self.capture.read_errors,
+            "camera_fps": self.capture.capture_rate.fps,
+            "capture_to_decision_ms": self.worker.latency_ms,
+            "frames_processed_total": self.worker.processed_frames,
+            "frames_dropped_total": self.worker.dropped_frames,
+            "inferences_run_total": self.monitor.inferences_run,
+            "inferences_skipped_total": self.monitor.inferences_skipped,
+            "emails_sent_total": self.alerts.sent,
+            "emails_failed_total": self.alerts.failed,
+            "emails_dropped_total": self.alerts.dropped,
+            "detection_fps": self.worker.inference_rate.fps,
+            "detection_target_fps": self.detect_rate.fps,
+            "display_fps": self.display_rate.fps,
+            "db_percent": self.db,
+            "alert": int(self.monitor.alert),
+        })
+        if METRICS_PORT is not None:
+            self._exporters.append(
+                PrometheusExporter(metrics, port=METRICS_PORT).start())
+            print(f"Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+        if METRICS_LOG is not None:
+            self._exporters.append(JsonLogExporter(
+                metrics, METRICS_LOG, METRICS_LOG_INTERVAL).start())
+
     def increase_sensitivity(self):
         self.monitor.sensitivity += 5
         self.sensitivity_label.config(
@@ -149,7 +306,19 @@ class App:
 
     def on_mouse_down(self, event):
         if not self.running:
-            self.roi_defined = False
+            if event.num == 3:
+                self.draw_mode = "exclude"
+            elif event.state & 0x1:  # Shift
+                self.draw_mode = "include"
+            else:
+                self.draw_mode = "roi"
+            if self.draw_mode != "roi" and not self.roi_defined:
+                # regions and exclusions are added to an existing ROI
+                self.draw_mode = "roi"
+            if self.draw_mode == "roi":
+                self.roi_defined = False
+                self.regions = []
+            self.status_text = None
             self.drawing = True
             self.ix = event.x
             self.iy = event.y
@@ -168,24 +337,79 @@ class App:
             self.fy = event.y
             x0, y0 = min(self.ix, self.fx), min(self.iy, self.fy)
             x1, y1 = max(self.ix, self.fx), max(self.iy, self.fy)
-            if x1 - x0 > 5 and y1 - y0 > 5:
-                self.roi_canvas = (x0, y0, x1 - x0, y1 - y0)
+            rect = (x0, y0, x1 - x0, y1 - y0)
+            if x1 - x0 <= 5 or y1 - y0 <= 5:
+                if self.draw_mode == "roi":
+                    self.roi_defined = False
+                return
+            if self.draw_mode == "roi":
+                self.roi_canvas = rect
                 self.roi_defined = True
+                return
+            if BASELINE_EMA is not None:
+                self._show_status("Regions need BASELINE_EMA = None")
+                return
+            if not self.regions:
+                # the plain ROI becomes the first region
+                self.regions.append(Region("roi", self.roi_canvas))
+            if self.draw_mode == "exclude":
+                n = sum(r.exclude for r in self.regions) + 1
+                self.regions.append(Region(f"exclude{n}", rect, exclude=True))
             else:
-                self.roi_defined = False
+                n = sum(not r.exclude for r in self.regions) + 1
+                self.regions.append(Region(f"region{n}", rect))
+            self.roi_canvas = bounds(
+                [r.rect for r in self.regions if not r.exclude])
+
+    def _regions_error(self):
+        # Monitor refuses regions together with an EMA baseline; catch it
+        # here, or the worker would fall back to the single ROI
+        if self.regions and BASELINE_EMA is not None:
+            return "Regions need BASELINE_EMA = None"
+        return None
+
+    def _show_status(self, text):
+        print(text)
+        self.status_text = text
 
     def toggle_running(self):
         if not self.roi_defined and not self.running:
             print("Please define an ROI by dragging on the video feed before starting.")
             return
+        error = self._regions_error()
+        if error is not None and not self.running:
+            self._show_status(error)
+            return
         self.running = not self.running
         self.start_btn.config(
             text="Stop Monitoring" if self.running else "Start Monitoring")
         if self.running:
             print("Monitoring started.")
-            self.monitor.reset()
+            self.db = 0
+            if self.diff_log is not None:
+                self.diff_log.rotate()  # one file per print
+            # a frame may still be in analyze(), so the worker swaps the
+            # regions in on its own thread along with the monitor reset
+            self.worker.reset(list(self.regions) or None)
+            self.detect_rate.reset()
+            self.ring.reset()
+            if self.filament is None:
+                self.filament_status_label.config(
+                    text="Filament sensor not used", fg="black")
+            else:
+                self.filament.events()  # changes while stopped don't count
+                self.filament.arm()
+                if self.filament.present is not None:
+                    self._update_filament_status(self.filament.present)
         else:
             print("Monitoring stopped.")
+            self.worker.reset()
+            if self.filament is not None:
+                self.filament.arm(False)
+            self.filament_state = -1
+            self.filament_status_label.config(
+                text="Filament: Not Tracking" if self.filament
+                else "Filament: N/A (No GPIO)", fg="black")
             self.printer_paused_by_user = False
             self.printer_paused_by_filament = False
             self.filament_alert_email_sent = False
@@ -204,9 +428,9 @@ class App:
 
     def _apply_printer_pause_state(self):
         if self.printer_paused_by_user or self.printer_paused_by_filament:
-            set_printer_state_hw(False)
+            self.gpio.set_printer_state(False)
         else:
-            set_printer_state_hw(True)
+            self.gpio.set_printer_state(True)
 
     def open_settings(self):
         settings_window = tk.Toplevel(self.root)
@@ -232,6 +456,8 @@ class App:
             self.sender_email = sender_email_entry.get()
             self.sender_password = sender_password_entry.get()
             self.recipient_email = recipient_email_entry.get()
+            self.alerts.configure(
+                self.sender_email, self.sender_password, self.recipient_email)
             settings_window.destroy()
 
         save_btn = tk.Button(settings_window, text="Save",
@@ -239,23 +465,18 @@ class App:
         save_btn.pack()
 
     def _check_filament_status(self):
-        if not GPIO_AVAILABLE:
-            self.filament_status_label.config(
-                text="Filament sensor not used" if self.running else "Filament: N/A (No GPIO)", fg="black")
+        # Picks up debounced sensor changes; a run-out has already paused
+        # the printer on the watcher thread by the time it shows up here
+        if self.filament is None:
             return
-
-        if not self.running:
-            self.filament_status_label.config(
-                text="Filament: Not Tracking", fg="black")
-            if self.printer_paused_by_filament:
-                print(
-                    "Monitoring stopped while printer was paused by filament. Resetting filament pause state.")
-                self.printer_paused_by_filament = False
-                self.filament_alert_email_sent = False
-                self._apply_printer_pause_state()
-            return
-
-        filament_present = is_filament_present_hw()
+        for present, latency in self.filament.events():
+            if latency is not None and self.metrics is not None:
+                self.metrics.record("filament_pause", latency)
+            if self.running:
+                self._update_filament_status(present)
+
+    def _update_filament_status(self, filament_present):
+        self.filament_state = int(filament_present)
         if not filament_present:
             self.filament_status_label.config(
                 text="Filament: RAN OUT!", fg="red")
@@ -275,24 +496,14 @@ class App:
                     </html>
                     """
                     if self.sender_email and self.sender_password and self.recipient_email:
-                        try:
-                            send_alert_email(
-                                from_email=self.sender_email,
-                                password=self.sender_password,
-                                to_email=self.recipient_email,
-                                subject=email_subject,
-                                body=email_body,
-                                image_path=None
-                            )
-                            print("Filament run-out email notification sent.")
-                            self.filament_alert_email_sent = True
-                        except Exception as e:
-                            print(f"Error sending filament run-out email: {e}")
-                            self.filament_alert_email_sent = True
+                        self.alerts.send(email_subject, email_body)
+                        if self.metrics is not None:
+                            self.metrics.inc("filament_runouts_total")
+                        print("Filament run-out email notification queued.")
                     else:
                         print(
                             "Email credentials not set, cannot send filament run-out email.")
-                        self.filament_alert_email_sent = True
+                    self.filament_alert_email_sent = True
                 self._apply_printer_pause_state()
         else:
             self.filament_status_label.config(
@@ -303,94 +514,190 @@ class App:
                 self.filament_alert_email_sent = False
                 self._apply_printer_pause_state()
 
+    def _send_motion_alert(self, frame):
+        print("Motion alert triggered by monitor.")
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        motion_subject = "3D Printer Alert: Motion Detected"
+        where = "ROI"
+        if self.monitor.regions is not None:
+            names = [r.name for r in self.monitor.regions.includes if r.alert]
+            where = "region" + ("s " if len(names) > 1 else " ") + \
+                ", ".join(names)
+        clip = self.ring.snapshot()
+        clip_html = ""
+        if clip is not None:
+            clip_html = (f"<p>The last {clip[2][-1] - clip[2][0]:.0f} s "
+                         f"before the alert:</p>\n"
+                         f'            <p><img src="cid:alert_clip"></p>')
+        motion_body = f"""
+        <html>
+          <body>
+            <h2>3D Printer Alert: Motion Detected</h2>
+            <p>Motion was detected in the monitored {where} at {timestamp}.</p>
+            <p><img src="cid:alert_image"></p>
+            {clip_html}
+          </body>
+        </html>
+        """
+        if self.sender_email and self.sender_password and self.recipient_email:
+            # the frame and the clip are encoded on the dispatcher thread
+            attachments = None
+            if clip is not None:
+                attachments = [("alert_clip.gif",
+                                lambda: encode_gif(*clip, MINT_BGR,
+                                                   BLEND_ALPHA),
+                                "alert_clip")]
+            self.alerts.send(motion_subject, motion_body, frame, attachments)
+            print("Motion detection email queued.")
+        else:
+            print(
+                "Email credentials not set, cannot send motion detection email.")
+
     def update_frame(self):
-        ret, frame = self.cap.read()
-        if not ret:
-            self.root.after(100, self.update_frame)
+        metrics = self.metrics
+        t_start = time.perf_counter()
+        latest = self.capture.latest(self._frame_seq)
+        if latest is None:
+            # nothing new from the camera yet
+            self.root.after(5, self.update_frame)
             return
-
-        disp = frame.copy()
+        self._frame_seq, frame, frame_ts = latest
+        if metrics is not None:
+            metrics.record("frame_age", t_start - frame_ts)
+
+        if self.loader is not None and self.loader.done:
+            self._on_model_ready()
+        self._frames_displayed += 1
+        self.display_rate.tick()
         self._check_filament_status()
 
+        t0 = time.perf_counter()
+        cv2.resize(frame, (CANVAS_W, self.CANVAS_H), self._canvas_bgr,
+                   interpolation=cv2.INTER_AREA)
         if self.running:
-            disp, alert_triggered, db = self.monitor.process_frame(
-                frame, self.roi_canvas, self.sx, self.sy)
-            if alert_triggered:
-                print("Motion alert triggered by monitor.")
-                image_path = "alert_image.jpg"
-                cv2.imwrite(image_path, frame)
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                motion_subject = "3D Printer Alert: Motion Detected"
-                motion_body = f"""
-                <html>
-                  <body>
-                    <h2>3D Printer Alert: Motion Detected</h2>
-                    <p>Motion was detected in the monitored ROI at {timestamp}.</p>
-                    <p><img src="cid:alert_image"></p>
-                  </body>
-                </html>
-                """
-                if self.sender_email and self.sender_password and self.recipient_email:
-                    try:
-                        send_alert_email(
-                            from_email=self.sender_email,
-                            password=self.sender_password,
-                            to_email=self.recipient_email,
-                            subject=motion_subject,
-                            body=motion_body,
-                            image_path=image_path
-                        )
-                        print("Motion detection email sent.")
-                    except Exception as e:
-                        print(f"Error sending motion detection email: {e}")
-                else:
-                    print(
-                        "Email credentials not set, cannot send motion detection email.")
-
+            self.ring.push(self._canvas_bgr,
+                           self.monitor.scaled_mask(1 / self.sx, 1 / self.sy))
+            if self.detect_rate.due():
+                self.worker.submit(frame, self.roi_canvas, self.sx, self.sy,
+                                   frame_ts)
+            result = self.worker.poll()
+            if result is not None:
+                alert_frame, alert_triggered, self.db = result
+                self.detect_rate.observe(self.worker.last_cost, self.db,
+                                         self.monitor.sensitivity)
+                if alert_triggered:
+                    t_alert = time.perf_counter()
+                    self._send_motion_alert(alert_frame)
+                    if metrics is not None:
+                        metrics.record("alert", time.perf_counter() - t_alert)
+                        metrics.inc("motion_alerts_total")
+            # overlay the most recent mask on the canvas-size frame
+            disp = self.monitor.draw_overlay(
+                self._canvas_bgr, 1 / self.sx, 1 / self.sy)
+            db = self.db
             text = f"Diff: {db:.1f}% / {self.monitor.sensitivity}%"
+            if self.monitor.roi_only:
+                text += f"  (-{self.monitor.latency_saved_ms:.0f} ms)"
             color = ALERT_BGR if db >= self.monitor.sensitivity else MINT_BGR
-            cv2.putText(disp, text, (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+            cv2.putText(disp, text, (6, 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1)
+            rates = (f"Det {self.worker.inference_rate.fps:.1f}/"
+                     f"{self.detect_rate.fps:.1f}"
+                     f"{' idle' if self.detect_rate.stable else ''} fps  "
+                     f"Disp {self.display_rate.fps:.1f} fps  "
+                     f"Lat {self.worker.latency_ms:.0f} ms  "
+                     f"Drop {self.worker.dropped_frames}  "
+                     f"Skip {self.monitor.inferences_skipped}")
+            cv2.putText(disp, rates, (6, 36),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, MINT_BGR, 1)
+        else:
+            disp = self._canvas_bgr
 
+        # ROI and text overlays are drawn in canvas coordinates
+        thickness = max(int(round(BOX_THICKNESS / self.sx)), 1)
         if self.drawing:
             x0, y0 = min(self.ix, self.fx), min(self.iy, self.fy)
             x1, y1 = max(self.ix, self.fx), max(self.iy, self.fy)
-            cv2.rectangle(disp, (int(x0 * self.sx), int(y0 * self.sy)),
-                          (int(x1 * self.sx), int(y1 * self.sy)), (0, 255, 0), BOX_THICKNESS)
-        elif self.roi_defined:
-            x_c, y_c, w_c, h_c = self.roi_canvas
-            x, y, rw, rh = int(x_c * self.sx), int(y_c *
-                                                   self.sy), int(w_c * self.sx), int(h_c * self.sy)
+            color = (128, 128, 128) if self.draw_mode == "exclude" \
+                else (0, 255, 0)
+            cv2.rectangle(disp, (x0, y0), (x1, y1), color, thickness)
+        if self.regions and not self.running:
+            for r in self.regions:
+                x, y, rw, rh = r.rect
+                color = (128, 128, 128) if r.exclude else MINT_BGR
+                cv2.rectangle(disp, (x, y), (x+rw, y+rh), color, thickness)
+        elif self.roi_defined and not self.drawing and not (
+                self.running and self.monitor.regions is not None):
+            # with regions, Monitor draws their boxes while running
+            x, y, rw, rh = self.roi_canvas
             roi_color = MINT_BGR
-            if self.running and hasattr(self.monitor, 'alert_state') and self.monitor.alert_state:
+            if self.running and self.monitor.alert:
                 roi_color = ALERT_BGR
-            cv2.rectangle(disp, (x, y), (x+rw, y+rh), roi_color, BOX_THICKNESS)
+            cv2.rectangle(disp, (x, y), (x+rw, y+rh), roi_color, thickness)
 
         if not self.roi_defined and not self.drawing and not self.running:
-            cv2.putText(disp, "Set a bounding box to start", (10, 30),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            cv2.putText(disp, "Set a bounding box to start", (6, 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+        if self.status_text and not self.running:
+            cv2.putText(disp, self.status_text, (6, 36),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
 
-        disp_rgb = cv2.cvtColor(disp, cv2.COLOR_BGR2RGB)
-        disp_pil = Image.fromarray(disp_rgb).resize((CANVAS_W, self.CANVAS_H))
+        cv2.cvtColor(disp, cv2.COLOR_BGR2RGB, self._canvas_rgb)
         try:
-            self.photo = ImageTk.PhotoImage(disp_pil)
-            self.canvas.image = self.photo
-            self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
+            self.photo.paste(Image.fromarray(self._canvas_rgb))
         except RuntimeError as e:
             if "main window deleted" in str(e).lower():
                 print("Tkinter main window deleted, stopping updates.")
                 return
             raise
-
-        self.root.after(30, self.update_frame)
+        t_end = time.perf_counter()
+        self._display_s += t_end - t0
+        self._display_frames += 1
+        if metrics is not None:
+            metrics.record("display", t_end - t0)
+            metrics.record("frame", t_end - t_start)
+        self._report_display_stats()
+
+        # the frame's own cost comes off the refresh interval
+        delay = 1.0 / DISPLAY_FPS - (time.perf_counter() - t_start)
+        self.root.after(max(int(delay * 1000), 1), self.update_frame)
+
+    def _report_display_stats(self):
+        # Periodic CPU and memory report to catch slow growth over long prints
+        now = time.monotonic()
+        elapsed = now - self._stats_wall
+        if elapsed < DISPLAY_STATS_INTERVAL:
+            return
+        cpu = time.process_time()
+        frames = max(self._display_frames, 1)
+        print(f"Display: {self._display_s / frames * 1000:.2f} ms/frame over "
+              f"{self._display_frames} frames, process CPU "
+              f"{(cpu - self._stats_cpu) / elapsed * 100:.0f}%, RSS "
+              f"{_rss_mb():.0f} MB, canvas items "
+              f"{len(self.canvas.find_all())}")
+        self._stats_wall = now
+        self._stats_cpu = cpu
+        self._display_s = 0.0
+        self._display_frames = 0
 
     def __del__(self):
-        if self.cap and self.cap.isOpened():
-            self.cap.release()
+        if self.worker is not None:
+            self.worker.stop()
+        self.alerts.stop()
+        for exporter in self._exporters:
+            exporter.stop()
+        if self.diff_log is not None:
+            self.diff_log.close()
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
             print("Camera released.")
-        if GPIO_AVAILABLE:
+        if self.filament is not None:
+            self.filament.stop()
+            self.filament = None
+        if not self.gpio.simulated:
             try:
-                GPIO.cleanup()
+                self.gpio.cleanup()
                 print("GPIO cleaned up.")
             except Exception as e:
                 print(f"Error during GPIO cleanup in __del__: {e}")
@@ -402,12 +709,17 @@ if __name__ == "__main__":
     try:
         root.mainloop()
     finally:
-        if GPIO_AVAILABLE and 'GPIO' in locals() and GPIO is not None:
+        gpio = getattr(app, 'gpio', None) if 'app' in locals() else None
+        if gpio is not None and not gpio.simulated:
+            if app.filament is not None:
+                app.filament.stop()
+                app.filament = None
             try:
-                GPIO.cleanup()
+                gpio.cleanup()
                 print("GPIO cleaned up on exit.")
             except Exception as e:
                 print(f"Note: Error during GPIO cleanup on exit: {e}")
-        if 'app' in locals() and hasattr(app, 'cap') and app.cap and app.cap.isOpened():
-            app.cap.release()
+        if 'app' in locals() and getattr(app, 'capture', None) is not None:
+            app.capture.stop()
+            app.capture = None
             print("Camera released on exit.")
@@ -0,0 +1,198 @@
+import queue
+import smtplib
+import threading
+
+import cv2
+
+from email_sender import SMTP_HOST, SMTP_PORT, build_alert_message
+
+
+class SmtpConnection:
+    # An authenticated SMTP connection that is kept open between alerts and
+    # re-established when the server has dropped it.
+
+    def __init__(self, host, port, user, password, use_ssl=True, timeout=10):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._server = None
+
+    def _connect(self):
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port,
+                                      timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.password:
+            server.login(self.user, self.password)
+        self._server = server
+
+    def send(self, msg, from_email, to_email):
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.sendmail(from_email, to_email, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # idle connections get closed by the server; retry once fresh
+            self.close()
+            self._connect()
+            self._server.sendmail(from_email, to_email, msg.as_string())
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+
+class AlertDispatcher:
+    # Sends alert emails from a worker thread so the frame loop never waits
+    # on the mail server. Alerts go through a bounded queue; frames are
+    # JPEG-encoded in memory on the worker; failed sends are retried with
+    # exponential backoff.
+
+    def __init__(
+        self,
+        host=SMTP_HOST,
+        port=SMTP_PORT,
+        use_ssl=True,
+        max_queue=16,
+        max_retries=5,
+        backoff=1.0,
+        max_backoff=60.0,
+        jpeg_quality=90,
+    ):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jpeg_quality = jpeg_quality
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self.sender_email = None
+        self.sender_password = None
+        self.recipient_email = None
+        self._connection = None
+        self._queue = queue.Queue(max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def configure(self, sender_email, sender_password, recipient_email):
+        # picked up by the worker before the next alert
+        self._queue_put(("configure", (sender_email, sender_password,
+                                       recipient_email)))
+
+    @property
+    def configured(self):
+        return bool(self.sender_email and self.sender_password
+                    and self.recipient_email)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def send(self, subject, body, frame=None, attachments=None):
+        # Queue an alert; frame is a BGR image attached as alert_image.jpg.
+        # attachments are (filename, data, content_id) where data may be a
+        # callable, run on the worker, e.g. to encode a clip off the
+        # capture thread. Returns False when the queue is full and the alert
+        # was dropped.
+        return self._queue_put(("alert", (subject, body, frame, attachments)))
+
+    def _queue_put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print("Alert queue full, dropping alert.")
+            return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is None:
+                break
+            kind, payload = item
+            if kind == "configure":
+                self._configure(*payload)
+            else:
+                self._deliver(*payload)
+        if self._connection is not None:
+            self._connection.close()
+
+    def _configure(self, sender_email, sender_password, recipient_email):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.recipient_email = recipient_email
+
+    def _deliver(self, subject, body, frame, attachments):
+        if not self.configured:
+            print(f"Email credentials not set, cannot send '{subject}'.")
+            return
+        image_bytes = None
+        if frame is not None:
+            ok, buf = cv2.imencode(
+                ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ok:
+                image_bytes = buf.tobytes()
+        files = []
+        for name, data, content_id in attachments or ():
+            if callable(data):
+                try:
+                    data = data()
+                except Exception as e:
+                    print(f"Error preparing attachment {name}: {e}")
+                    continue
+            files.append((name, data, content_id))
+        msg = build_alert_message(self.sender_email, self.recipient_email,
+                                  subject, body, image_bytes,
+                                  attachments=files)
+
+        if self._connection is None:
+            self._connection = SmtpConnection(
+                self.host, self.port, self.sender_email,
+                self.sender_password, self.use_ssl)
+        delay = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self._connection.send(msg, self.sender_email,
+                                      self.recipient_email)
+                self.sent += 1
+                print(f"Alert email sent: {subject}")
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"Error sending alert email (attempt {attempt}/"
+                      f"{self.max_retries}): {e}")
+                self._connection.close()
+                if attempt == self.max_retries or self._stop.wait(delay):
+                    break
+                delay = min(delay * 2, self.max_backoff)
+        self.failed += 1
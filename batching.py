@@ -0,0 +1,78 @@
+import time
+
+
+class BatchScheduler:
+    # Collects ROI crops from several Monitors (or several frames of one
+    # Monitor) and segments them with a single forward pass. A batch is
+    # flushed when it reaches `max_batch` crops or when the oldest crop has
+    # waited `max_latency` seconds. A crop that fails (or a whole batch, if
+    # the forward pass fails) is left out of the results and reported by
+    # errors() instead, so one bad frame does not cost the others theirs.
+
+    def __init__(self, engine, max_batch=4, max_latency=0.05):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.batches = 0
+        self.batched_frames = 0
+        self._pending = []
+        self._deadline = None
+        self._errors = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, monitor, frame, roi_canvas, sx, sy, context=None):
+        # Returns the list of results that became ready:
+        # (context, frame, alert_triggered, db)
+        rect = monitor.locate(frame, roi_canvas, sx, sy)
+        skipped = monitor.skip_inference(frame, rect)
+        if skipped is not None:
+            return [(context, frame) + skipped]
+
+        crop, window = monitor.inference_crop(frame, rect, reuse_buffer=False)
+        if not self._pending:
+            self._deadline = time.perf_counter() + self.max_latency
+        self._pending.append((monitor, frame, rect, crop, window, context))
+        if len(self._pending) >= self.max_batch:
+            return self.flush()
+        return []
+
+    def time_to_deadline(self):
+        if not self._pending:
+            return None
+        return max(self._deadline - time.perf_counter(), 0.0)
+
+    def errors(self):
+        # (context, exception) for every crop dropped since the last call
+        errors, self._errors = self._errors, []
+        return errors
+
+    def poll(self):
+        if self._pending and time.perf_counter() >= self._deadline:
+            return self.flush()
+        return []
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self._deadline = None
+        if not pending:
+            return []
+        try:
+            alphas = self.engine.alpha_batch([p[3] for p in pending])
+        except Exception as e:
+            self._errors.extend((p[5], e) for p in pending)
+            return []
+        self.batches += 1
+        self.batched_frames += len(pending)
+
+        results = []
+        # in submission order, so consecutive frames of one Monitor stay in order
+        for (monitor, frame, rect, _, window, context), alpha in zip(pending, alphas):
+            try:
+                alert_triggered, db = monitor.update(rect, alpha, window)
+            except Exception as e:
+                self._errors.append((context, e))
+                continue
+            results.append((context, frame, alert_triggered, db))
+        return results
@@ -0,0 +1,265 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from frame_source import load_frames, parse_roi
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+CANVAS_W = 410
+BLEND_ALPHA = 0.4
+MINT_BGR = (201, 252, 157)
+ALERT_BGR = (0, 0, 255)
+BOX_THICKNESS = 4
+
+DEFAULT_MODELS = "u2netp,u2net,silueta,isnet-general-use"
+STAGES = ("preprocess", "inference", "mask_diff", "overlay", "display",
+          "total")
+
+
+class StageRecorder:
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def display_convert(frame, monitor, canvas_bgr, canvas_rgb, recorder):
+    # the work App.update_frame does to get a frame onto the Tk canvas:
+    # one resize, the overlay at canvas resolution, one colour conversion.
+    # The overlay is timed as its own stage by the Monitor, so "display"
+    # is the resize and conversion only and the stages add up.
+    h, w = frame.shape[:2]
+    t0 = time.perf_counter()
+    cv2.resize(frame, (CANVAS_W, canvas_bgr.shape[0]), canvas_bgr,
+               interpolation=cv2.INTER_AREA)
+    t1 = time.perf_counter()
+    disp = monitor.draw_overlay(canvas_bgr, CANVAS_W / w,
+                                canvas_bgr.shape[0] / h)
+    t2 = time.perf_counter()
+    cv2.cvtColor(disp, cv2.COLOR_BGR2RGB, canvas_rgb)
+    image = Image.fromarray(canvas_rgb)
+    recorder.record("display", (t1 - t0) + (time.perf_counter() - t2))
+    return image
+
+
+def run_model(opts):
+    # Runs in a fresh process per model so peak RSS belongs to that model
+    from monitor import Monitor
+
+    frames = load_frames(opts["source"], opts["frames"])
+    if not frames:
+        raise RuntimeError(f"No frames read from {opts['source']}")
+    fh, fw = frames[0].shape[:2]
+    roi = opts["roi"] or (fw // 4, fh // 4, fw // 2, fh // 2)
+    canvas_h = int(CANVAS_W * fh / fw)
+    canvas_bgr = np.empty((canvas_h, CANVAS_W, 3), np.uint8)
+    canvas_rgb = np.empty_like(canvas_bgr)
+
+    t0 = time.perf_counter()
+    monitor = Monitor(opts["sensitivity"], opts["consecutive_threshold"],
+                      BLEND_ALPHA, MINT_BGR, ALERT_BGR, BOX_THICKNESS,
+                      model_name=opts["model"], backend=opts["backend"],
+                      roi_only=opts["roi_only"],
+                      infer_scale=opts["infer_scale"],
+                      precision=opts["precision"])
+    load_s = time.perf_counter() - t0
+
+    for frame in frames[:opts["warmup"]]:
+        monitor.process_frame(frame, roi, 1, 1)
+
+    recorder = StageRecorder()
+    monitor.profiler = recorder
+    alerts = 0
+    # per-frame alert state and db of the first pass, for agreement checks
+    alert_states, dbs = [], []
+    for i in range(opts["repeat"]):
+        monitor.reset()
+        for frame in frames:
+            t0 = time.perf_counter()
+            alert_triggered, db = monitor.analyze(frame, roi, 1, 1)
+            display_convert(frame, monitor, canvas_bgr, canvas_rgb, recorder)
+            recorder.record("total", time.perf_counter() - t0)
+            alerts += alert_triggered
+            if i == 0:
+                alert_states.append(monitor.alert)
+                dbs.append(float(db))
+
+    total = recorder.samples["total"]
+    return {
+        "model": opts["model"],
+        "backend": opts["backend"],
+        "precision": opts["precision"],
+        "frames": len(total),
+        "frame_size": [fw, fh],
+        "roi": list(roi),
+        "infer_scale": opts["infer_scale"],
+        "model_load_s": load_s,
+        "fps": len(total) / sum(total),
+        "alerts": alerts,
+        "alert_states": alert_states,
+        "db": dbs,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: summarize(recorder.samples[stage])
+                   for stage in STAGES if stage in recorder.samples},
+    }
+
+
+def print_result(result):
+    rss = result["peak_rss_mb"]
+    rss_txt = f"{rss:.0f} MB" if rss is not None else "n/a"
+    print(f"\n[{result['model']} / {result['backend']} / "
+          f"{result['precision']}] "
+          f"{result['frames']} frames, {result['fps']:.2f} fps, "
+          f"peak RSS {rss_txt}, load {result['model_load_s']:.2f} s")
+    print(f"  {'stage':<11}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for stage, s in result["stages"].items():
+        print(f"  {stage:<11}{s['p50_ms']:9.2f}{s['p95_ms']:9.2f}"
+              f"{s['p99_ms']:9.2f}")
+
+
+def agreement(results):
+    # Latency, memory and alert agreement of each reduced-precision run
+    # against the fp32 run of the same model
+    ref = {r["model"]: r for r in results if r["precision"] == "fp32"}
+    rows = [r for r in results
+            if r["precision"] != "fp32" and r["model"] in ref]
+    if not rows:
+        return
+    print("\nAgainst fp32 of the same model:")
+    print(f"  {'model':<20}{'precision':<13}{'p50 ms':>14}{'RSS MB':>14}"
+          f"{'alert agree':>13}{'|db| mean':>11}")
+    for r in rows:
+        b = ref[r["model"]]
+        p50, b50 = (x["stages"]["total"]["p50_ms"] for x in (r, b))
+        rss, brss = r["peak_rss_mb"], b["peak_rss_mb"]
+        agree = np.mean(np.equal(r["alert_states"], b["alert_states"]))
+        db_err = np.abs(np.subtract(r["db"], b["db"])).mean()
+        rss_txt = f"{brss:.0f}->{rss:.0f}" if rss is not None else "n/a"
+        print(f"  {r['model']:<20}{r['precision']:<13}"
+              f"{f'{b50:.1f}->{p50:.1f}':>14}{rss_txt:>14}"
+              f"{agree * 100:12.1f}%{db_err:11.2f}")
+
+
+def compare(results, baseline, max_regression):
+    # Returns the models whose p50 frame latency regressed past the limit
+    def key(r):
+        return r["model"], r["backend"], r.get("precision", "fp32")
+
+    base = {key(r): r for r in baseline["results"]}
+    regressed = []
+    print("\nAgainst baseline (p50 total latency):")
+    for r in results:
+        b = base.get(key(r))
+        if b is None:
+            print(f"  {r['model']}: not in baseline")
+            continue
+        old = b["stages"]["total"]["p50_ms"]
+        new = r["stages"]["total"]["p50_ms"]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > max_regression:
+            regressed.append(r["model"])
+            flag = "  REGRESSION"
+        print(f"  {r['model']}: {old:.2f} -> {new:.2f} ms "
+              f"({change * 100:+.1f}%){flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline Monitor benchmark on recorded frames.")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--models", default=DEFAULT_MODELS,
+                        help="comma-separated rembg model names")
+    parser.add_argument("--backend", default="onnx")
+    parser.add_argument("--precisions", default="fp32",
+                        help="comma-separated, e.g. fp32,int8-static; "
+                             "variants are compared against fp32")
+    parser.add_argument("--roi", type=parse_roi,
+                        help="x,y,w,h in frame pixels (default: centre half)")
+    parser.add_argument("--full-frame", action="store_true",
+                        help="segment the whole frame instead of the ROI")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="inference scale factor passed to Monitor")
+    parser.add_argument("--frames", type=int, default=200,
+                        help="maximum frames to read from the source")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--sensitivity", type=float, default=30)
+    parser.add_argument("--consecutive-threshold", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed p50 slowdown against the baseline")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    runs = [(m.strip(), p.strip()) for m in args.models.split(",")
+            for p in args.precisions.split(",")]
+    for model, precision in runs:
+        opts = {
+            "source": args.source, "model": model,
+            "backend": args.backend, "precision": precision, "roi": args.roi,
+            "roi_only": not args.full_frame, "infer_scale": args.scale,
+            "frames": args.frames,
+            "warmup": args.warmup, "repeat": args.repeat,
+            "sensitivity": args.sensitivity,
+            "consecutive_threshold": args.consecutive_threshold,
+        }
+        with ctx.Pool(1) as pool:
+            try:
+                result = pool.apply(run_model, (opts,))
+            except Exception as e:
+                print(f"\n[{model} / {precision}] failed: {e}")
+                continue
+        print_result(result)
+        results.append(result)
+
+    agreement(results)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "source": args.source,
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.max_regression):
+            sys.exit(1)
@@ -0,0 +1,154 @@
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BLEND_ALPHA = 0.4
+MINT_BGR = (201, 252, 157)
+ALERT_BGR = (0, 0, 255)
+BOX_THICKNESS = 4
+
+
+class ReplayEngine:
+    # Stands in for the model: hands back precomputed masks so only the
+    # Monitor's own mask diff and overlay work is measured.
+
+    def __init__(self, alphas):
+        self.session = None
+        self.alphas = alphas
+        self.index = 0
+
+    def prepare(self, bgr):
+        return bgr
+
+    def predict(self, prepared, out_size=None, out=None):
+        alpha = self.alphas[self.index % len(self.alphas)]
+        self.index += 1
+        return alpha
+
+    def alpha(self, bgr, out=None):
+        return self.predict(bgr)
+
+
+class LegacyMonitor:
+    # Mask diff and overlay as Monitor.process_frame did them before the
+    # preallocated buffers, kept here as the comparison point.
+
+    def __init__(self, sensitivity, consecutive_threshold, engine):
+        self.sensitivity = sensitivity
+        self.consecutive_threshold = consecutive_threshold
+        self.engine = engine
+        self.baseline_mask = None
+        self.prev_mask = None
+        self.abnormal_count = 0
+        self.alert = False
+        self.db = 0
+
+    def process_frame(self, frame, rect):
+        x, y, rw, rh = rect
+        disp = frame.copy()
+        alpha = self.engine.alpha(frame)
+        mask = alpha[y: y + rh, x: x + rw]
+
+        alert_triggered_this_frame = False
+        if self.baseline_mask is None:
+            self.baseline_mask = mask.copy()
+            self.prev_mask = mask.copy()
+        else:
+            total = rw * rh * 255.0
+            dp = cv2.absdiff(mask, self.prev_mask).sum() / total * 100
+            self.db = cv2.absdiff(mask, self.baseline_mask).sum() / total * 100
+            if dp < self.sensitivity and self.db < self.sensitivity:
+                self.abnormal_count = 0
+                self.baseline_mask = mask.copy()
+                self.alert = False
+            else:
+                self.abnormal_count += 1
+                if (self.abnormal_count >= self.consecutive_threshold
+                        and not self.alert):
+                    self.alert = True
+                    alert_triggered_this_frame = True
+            self.prev_mask = mask.copy()
+
+        overlay = disp.copy()
+        reg = overlay[y: y + rh, x: x + rw]
+        green = np.zeros_like(reg)
+        green[:] = MINT_BGR
+        mroi = (mask > 0)
+        tinted = cv2.addWeighted(reg, 1 - BLEND_ALPHA, green, BLEND_ALPHA, 0)
+        reg[mroi] = tinted[mroi]
+        overlay[y: y + rh, x: x + rw] = reg
+        disp = overlay
+        if self.alert:
+            red = np.zeros_like(disp)
+            red[:] = ALERT_BGR
+            disp = cv2.addWeighted(disp, 0.5, red, 0.5, 0)
+        return disp, alert_triggered_this_frame, self.db
+
+
+def measure(process, frames):
+    # Returns (ms per frame, mean transient bytes per frame, results)
+    for frame in frames[:3]:
+        process(frame)
+
+    start = time.perf_counter()
+    results = [process(frame)[1:] for frame in frames]
+    ms = (time.perf_counter() - start) / len(frames) * 1000
+
+    transient = []
+    tracemalloc.start()
+    for frame in frames:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        process(frame)
+        transient.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return ms, float(np.mean(transient)), results
+
+
+if __name__ == "__main__":
+    from monitor import Monitor
+
+    parser = argparse.ArgumentParser(
+        description="Per-frame allocation and time of Monitor's mask diff "
+                    "and overlay path, against the pre-buffer version.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    w, h = args.width, args.height
+    rect = (w // 4, h // 4, w // 2, h // 2)
+    frames = [rng.integers(0, 256, (h, w, 3), np.uint8) for _ in range(8)]
+    frames = [frames[i % len(frames)] for i in range(args.frames)]
+    # blobs that move now and then, so both normal and alert frames occur
+    alphas = []
+    for i in range(16):
+        alpha = np.zeros((h, w), np.uint8)
+        cx = w // 2 + (i // 4) * w // 10
+        cv2.circle(alpha, (cx, h // 2), h // 6, 255, -1)
+        alphas.append(alpha)
+
+    legacy = LegacyMonitor(30, 3, ReplayEngine(alphas))
+    current = Monitor(30, 3, BLEND_ALPHA, MINT_BGR, ALERT_BGR,
+                      BOX_THICKNESS, engine=ReplayEngine(alphas))
+
+    def run_current(frame):
+        alert_triggered, db = current.analyze(frame, rect, 1, 1)
+        return current.draw_overlay(frame), alert_triggered, db
+
+    old_ms, old_bytes, old_results = measure(
+        lambda f: legacy.process_frame(f, rect), frames)
+    new_ms, new_bytes, new_results = measure(run_current, frames)
+
+    print(f"{w}x{h} frame, {rect[2]}x{rect[3]} ROI, {len(frames)} frames")
+    print(f"  before: {old_ms:7.3f} ms/frame, "
+          f"{old_bytes / 1024:9.1f} KiB allocated per frame")
+    print(f"  after:  {new_ms:7.3f} ms/frame, "
+          f"{new_bytes / 1024:9.1f} KiB allocated per frame")
+    same = all(a[0] == b[0] and abs(a[1] - b[1]) < 1e-6
+               for a, b in zip(old_results, new_results))
+    print(f"  alerts and db identical: {same}")
@@ -0,0 +1,70 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from frame_source import load_frames, parse_roi
+from mask_engine import create_mask_engine
+
+
+def synthetic_frames(count, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (height, width, 3), np.uint8)
+            for _ in range(count)]
+
+
+def benchmark_batches(engine, crops, batch_sizes, runs=3):
+    results = []
+    for batch_size in batch_sizes:
+        # warm-up so session set-up and buffer allocation are not timed
+        engine.alpha_batch(crops[:batch_size])
+        best = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            for i in range(0, len(crops), batch_size):
+                engine.alpha_batch(crops[i: i + batch_size])
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        fps = len(crops) / best
+        results.append({"batch_size": batch_size, "fps": fps,
+                        "ms_per_frame": best / len(crops) * 1000})
+        print(f"batch {batch_size:3d}: {fps:8.2f} frames/s "
+              f"({best / len(crops) * 1000:.2f} ms/frame)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Segmentation throughput (frames/sec) against batch size.")
+    parser.add_argument("--model", default="u2netp")
+    parser.add_argument("--backend", default="onnx")
+    parser.add_argument("--source",
+                        help="video file or image directory (default: noise)")
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--roi", type=parse_roi,
+                        help="x,y,w,h in frame pixels (default: centre half)")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.source:
+        frames = load_frames(args.source, args.frames)
+    else:
+        frames = synthetic_frames(args.frames)
+    if not frames:
+        raise SystemExit("No frames to benchmark")
+    fh, fw = frames[0].shape[:2]
+    x, y, w, h = args.roi or (fw // 4, fh // 4, fw // 2, fh // 2)
+    crops = [f[y: y + h, x: x + w] for f in frames]
+
+    engine = create_mask_engine(args.backend, args.model)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    print(f"{args.model} ({args.backend}), {len(crops)} crops of {w}x{h}")
+    results = benchmark_batches(engine, crops, batch_sizes, args.runs)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "backend": args.backend,
+                       "crop": [w, h], "results": results}, f, indent=2)
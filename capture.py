@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+
+import cv2
+
+from inference_worker import RateCounter
+
+
+class CaptureThread:
+    # Reads the camera on its own thread and keeps only the newest frame,
+    # stamped with time.perf_counter() when it was read, so consumers never
+    # block on the driver or work on frames queued up seconds ago. After
+    # max_failures failed reads in a row the camera is reopened. A video
+    # file is not: at its end the thread stops and sets `ended`.
+
+    def __init__(
+        self,
+        source=0,
+        width=None,
+        height=None,
+        fps=None,
+        fourcc=None,
+        buffer_size=1,
+        max_failures=10,
+        reopen_delay=2.0,
+    ):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.fourcc = fourcc  # e.g. "MJPG" or "YUYV"
+        self.buffer_size = buffer_size
+        self.max_failures = max_failures
+        self.reopen_delay = reopen_delay
+        self.frames = 0
+        self.read_errors = 0
+        self.reopens = 0
+        self.capture_rate = RateCounter()
+        self.frame_size = None
+        # a recording rather than a device or stream; it ends instead of
+        # being reopened
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.ended = False
+
+        self._cap = None
+        self._cond = threading.Condition()
+        self._latest = None  # (seq, frame, ts)
+        self._running = False
+        self._thread = None
+
+    def open(self):
+        # Opens the camera with the requested settings; returns the
+        # (width, height) the driver actually gave us
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise RuntimeError(f"Cannot open camera {self.source!r}")
+        # the pixel format has to be set before the size for some drivers
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC,
+                    cv2.VideoWriter_fourcc(*self.fourcc))
+        if self.width:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        if self.height:
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if self.buffer_size is not None:
+            # not every backend honours this; reading on our own thread
+            # drains the queue either way
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        self._cap = cap
+        self.frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        return self.frame_size
+
+    def describe(self):
+        cap = self._cap
+        if cap is None:
+            return "closed"
+        code = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4))
+        w, h = self.frame_size
+        return (f"{w}x{h} @ {cap.get(cv2.CAP_PROP_FPS):g} fps, "
+                f"{fourcc.strip() or '?'}, buffer "
+                f"{cap.get(cv2.CAP_PROP_BUFFERSIZE):g}")
+
+    def start(self):
+        if self._cap is None:
+            self.open()
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def latest(self, after=None):
+        # (seq, frame, ts) of the newest frame, or None if there is none
+        # newer than seq `after`. The frame is never written to again.
+        with self._cond:
+            latest = self._latest
+        if latest is None or latest[0] == after:
+            return None
+        return latest
+
+    def wait(self, after=None, timeout=1.0):
+        # Like latest(), but blocks up to timeout for a newer frame
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self._running or (
+                    self._latest is not None and self._latest[0] != after),
+                timeout)
+        return self.latest(after)
+
+    def _run(self):
+        failures = 0
+        seq = 0
+        while self._running:
+            cap = self._cap
+            ret, frame = cap.read() if cap is not None else (False, None)
+            ts = time.perf_counter()
+            if not ret and self.is_file:
+                self._end()
+                return
+            if not ret:
+                self.read_errors += 1
+                failures += 1
+                if failures >= self.max_failures:
+                    self._reopen()
+                    failures = 0
+                else:
+                    time.sleep(0.01)
+                continue
+            failures = 0
+            seq += 1
+            self.frames += 1
+            self.capture_rate.tick()
+            with self._cond:
+                self._latest = (seq, frame, ts)
+                self._cond.notify_all()
+
+    def _end(self):
+        print(f"End of video {self.source!r} after {self.frames} frames.")
+        with self._cond:
+            self.ended = True
+            self._running = False
+            self._cond.notify_all()
+
+    def _reopen(self):
+        print(f"Camera {self.source!r} stopped delivering frames, reopening.")
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+        time.sleep(self.reopen_delay)
+        try:
+            self.open()
+            self.reopens += 1
+        except RuntimeError as e:
+            print(e)
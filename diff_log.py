@@ -0,0 +1,178 @@
+import argparse
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"PMDIFF01"
+HEADER_SIZE = 16  # magic, record size (u4), reserved (u4)
+
+# one fixed-width little-endian record per analysed frame (20 bytes)
+RECORD_DTYPE = np.dtype([
+    ("ts", "<f8"),              # unix time
+    ("dp", "<f4"),              # % change against the previous mask
+    ("db", "<f4"),              # % change against the baseline mask
+    ("abnormal_count", "<u2"),
+    ("alert", "u1"),
+    ("filament", "i1"),         # 1 present, 0 ran out, -1 unknown
+])
+
+
+class DiffLogger:
+    # Append-only log of Monitor's per-frame diff metrics. Records collect
+    # in a preallocated buffer and go to disk in one write every
+    # flush_records records or flush_interval seconds, which keeps SD card
+    # writes few and large. A new file is started when the current one
+    # passes max_bytes, and on rotate() (e.g. when a print starts).
+
+    def __init__(self, directory, prefix="diff", max_bytes=8 << 20,
+                 flush_records=512, flush_interval=30.0):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.path = None
+        self._buf = np.zeros(flush_records, RECORD_DTYPE)
+        self._n = 0
+        self._file = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, ts, dp, db, abnormal_count, alert, filament=-1):
+        with self._lock:
+            rec = self._buf[self._n]
+            rec["ts"] = ts
+            rec["dp"] = dp
+            rec["db"] = db
+            rec["abnormal_count"] = min(abnormal_count, 0xFFFF)
+            rec["alert"] = alert
+            rec["filament"] = filament
+            self._n += 1
+            self.records += 1
+            if (self._n == len(self._buf) or time.monotonic()
+                    - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def rotate(self):
+        with self._lock:
+            self._flush()
+            self._close()
+
+    def close(self):
+        self.rotate()
+
+    def _open(self):
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + \
+            f"{int(now * 1000) % 1000:03d}"
+        path = os.path.join(self.directory, f"{self.prefix}-{stamp}.bin")
+        i = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory,
+                                f"{self.prefix}-{stamp}-{i}.bin")
+            i += 1
+        self._file = open(path, "ab")
+        header = MAGIC + np.array([RECORD_DTYPE.itemsize, 0],
+                                  "<u4").tobytes()
+        self._file.write(header)
+        self._size = HEADER_SIZE
+        self.path = path
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if self._n == 0:
+            return
+        try:
+            if self._file is None or self._size >= self.max_bytes:
+                self._close()
+                self._open()
+            data = self._buf[:self._n].tobytes()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except OSError as e:
+            print(f"Error writing diff log: {e}")
+        self._n = 0
+
+
+def read_log(path):
+    # Memory-maps one log file as a structured array (fields as in
+    # RECORD_DTYPE); a partly written last record is ignored.
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if header[:8] != MAGIC:
+        raise ValueError(f"{path} is not a diff log")
+    itemsize = int(np.frombuffer(header[8:12], "<u4")[0])
+    if itemsize != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} has {itemsize}-byte records, expected "
+                         f"{RECORD_DTYPE.itemsize}")
+    count = (os.path.getsize(path) - HEADER_SIZE) // itemsize
+    if count == 0:
+        return np.zeros(0, RECORD_DTYPE)
+    return np.memmap(path, RECORD_DTYPE, "r", offset=HEADER_SIZE,
+                     shape=(count,))
+
+
+def log_files(directory, prefix="diff"):
+    # only "{prefix}-YYYYmmdd-HHMMSSmmm[-i].bin", so printer "p1" does not
+    # pick up the files of "p1-x" or "p1-2"
+    stamp = "[0-9]" * 8 + "-" + "[0-9]" * 9
+    return sorted(glob.glob(os.path.join(
+        directory, f"{glob.escape(prefix)}-{stamp}*.bin")))
+
+
+def load_history(directory, prefix="diff", since=None, until=None):
+    # Every record between since and until (unix times) as one structured
+    # array; a single file comes back as its memmap without a copy
+    parts = []
+    for path in log_files(directory, prefix):
+        log = read_log(path)
+        if len(log) == 0:
+            continue
+        if since is not None or until is not None:
+            ts = log["ts"]
+            lo = 0 if since is None else np.searchsorted(ts, since)
+            hi = len(ts) if until is None else np.searchsorted(
+                ts, until, side="right")
+            log = log[lo:hi]
+        if len(log):
+            parts.append(log)
+    if not parts:
+        return np.zeros(0, RECORD_DTYPE)
+    parts.sort(key=lambda log: log["ts"][0])
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarise the diff logs in a directory.")
+    parser.add_argument("directory")
+    parser.add_argument("--prefix", default="diff")
+    args = parser.parse_args()
+
+    files = log_files(args.directory, args.prefix)
+    log = load_history(args.directory, args.prefix)
+    if len(log) == 0:
+        raise SystemExit(f"No records in {args.directory}")
+    hours = (log["ts"][-1] - log["ts"][0]) / 3600
+    alerts = np.count_nonzero(np.diff(log["alert"].astype(np.int8)) == 1)
+    print(f"{len(files)} files, {len(log)} records over {hours:.1f} h, "
+          f"{alerts} alerts")
+    for name in ("dp", "db"):
+        p = np.percentile(log[name], [50, 90, 99, 99.9])
+        print(f"  {name}: p50 {p[0]:.2f}  p90 {p[1]:.2f}  p99 {p[2]:.2f}  "
+              f"p99.9 {p[3]:.2f}")
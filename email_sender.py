@@ -3,42 +3,49 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 
+SMTP_HOST = 'smtp.naver.com'
+SMTP_PORT = 465
 
-def send_alert_email(image_path, timestamp):
-    # Put you email here
-    naver_user = 'emailhere@naver.com'
-    # Password here
-    naver_password = 'passwordhere!'
-    # To. email here
-    to_email = 'reciverhere@naver.com'
-    # You are all set
-    subject = 'Urgent! 3D printer fail detected'
-    html_body = f"""
-    <html>
-      <body>
-        <h2>3D Printer Failure Detected</h2>
-        <p>Failure detected at {timestamp}</p>
-        <p><img src="cid:alert_image"></p>
-      </body>
-    </html>
-    """
 
+def build_alert_message(from_email, to_email, subject, body,
+                        image_bytes=None, image_name='alert_image.jpg',
+                        attachments=None):
     msg = MIMEMultipart("related")
     msg["Subject"] = subject
-    msg["From"] = naver_user
+    msg["From"] = from_email
     msg["To"] = to_email
 
-    msg.attach(MIMEText(html_body, "html", _charset="utf-8"))
+    msg.attach(MIMEText(body, "html", _charset="utf-8"))
 
-    with open(image_path, 'rb') as img_file:
-        img = MIMEImage(img_file.read(), name='alert_image.jpg')
+    if image_bytes is not None:
+        # referenced from the HTML body as <img src="cid:alert_image">
+        img = MIMEImage(image_bytes, name=image_name)
         img.add_header('Content-ID', '<alert_image>')
         msg.attach(img)
 
-    try:
-        with smtplib.SMTP_SSL('smtp.naver.com', 465) as server:
-            server.login(naver_user, naver_password)
-            server.sendmail(naver_user, to_email, msg.as_string())
-        print('Alert email sent successfully!')
-    except Exception as e:
-        print('Failed to send alert email:', e)
+    # (filename, bytes, content_id); a content_id lets the HTML body show
+    # the attachment inline, e.g. <img src="cid:alert_clip">
+    for name, data, content_id in attachments or ():
+        part = MIMEImage(data, name=name)
+        part.add_header('Content-Disposition', 'attachment', filename=name)
+        if content_id:
+            part.add_header('Content-ID', f'<{content_id}>')
+        msg.attach(part)
+    return msg
+
+
+def send_alert_email(from_email, password, to_email, subject, body,
+                     image_path=None):
+    # One-off send over a fresh connection; the GUI uses AlertDispatcher
+    # from alerts.py, which keeps the connection open between alerts.
+    image_bytes = None
+    if image_path is not None:
+        with open(image_path, 'rb') as img_file:
+            image_bytes = img_file.read()
+    msg = build_alert_message(from_email, to_email, subject, body,
+                              image_bytes)
+
+    with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
+        server.login(from_email, password)
+        server.sendmail(from_email, to_email, msg.as_string())
+    print('Alert email sent successfully!')
@@ -0,0 +1,210 @@
+import argparse
+import queue
+import threading
+import time
+
+import numpy as np
+
+from printer_io import (FILAMENT_SENSOR_PIN, PRINTER_PAUSE_PIN,
+                        SimulatedDriver)
+
+
+class FilamentWatcher:
+    # Watches the filament sensor on its own thread. Edges from the pin
+    # driver wake it; the level must then hold still for `debounce` seconds
+    # (at most max_settle in all) before it counts. While armed, a run-out
+    # drives the pause pin right here, so the pause never waits on the
+    # video loop. Resuming is left to the owner, which also knows about
+    # user pauses. Every debounced change is queued for events(). The
+    # sensor is polled every poll_interval too, in case an edge is missed.
+
+    def __init__(
+        self,
+        driver,
+        sensor_pin=FILAMENT_SENSOR_PIN,
+        pause_pin=PRINTER_PAUSE_PIN,
+        debounce=0.05,
+        max_settle=0.5,
+        poll_interval=1.0,
+        present_level=False,  # sensor reads LOW with filament loaded
+    ):
+        self.driver = driver
+        self.sensor_pin = sensor_pin
+        self.pause_pin = pause_pin
+        self.debounce = debounce
+        self.max_settle = max_settle
+        self.poll_interval = poll_interval
+        self.present_level = present_level
+        self.present = None  # debounced state, None before the first read
+        self.armed = False
+        self.paused = False  # pause pin pulled for a run-out
+        self.edges = 0
+        self.last_latency = None  # edge to pause pin, seconds
+
+        self._events = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._edge_time = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return self
+        self.driver.setup_input(self.sensor_pin)
+        if self.pause_pin is not None:
+            self.driver.setup_output(self.pause_pin)
+        self._running = True
+        self.driver.watch(self.sensor_pin, self._on_edge)
+        self._wake.set()  # first read straight away
+        self._thread = threading.Thread(
+            target=self._run, name="filament-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        self._wake.set()
+        try:
+            self.driver.unwatch(self.sensor_pin)
+        except Exception as e:
+            print(f"Error removing filament sensor callback: {e}")
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def arm(self, armed=True):
+        # Armed, a run-out (or a sensor already empty) pauses the printer
+        with self._lock:
+            self.armed = armed
+            if not armed:
+                self.paused = False
+        self._wake.set()
+
+    def events(self):
+        # (present, latency) for every debounced change since the last
+        # call, oldest first; latency is edge to pause pin when this change
+        # paused the printer, else None
+        out = []
+        while True:
+            try:
+                out.append(self._events.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _on_edge(self):
+        # driver thread: note when the first edge of a burst came in
+        self.edges += 1
+        if self._edge_time is None:
+            self._edge_time = time.perf_counter()
+        self._wake.set()
+
+    def _settle(self):
+        # the sensor level once it has stayed put for `debounce`, or
+        # whatever it reads after max_settle on a line that keeps bouncing
+        start = time.perf_counter()
+        while True:
+            remaining = self.max_settle - (time.perf_counter() - start)
+            if remaining <= 0 or not self._wake.wait(
+                    min(self.debounce, remaining)):
+                return self.driver.read(self.sensor_pin)
+            self._wake.clear()
+
+    def _run(self):
+        while self._running:
+            woke = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if not self._running:
+                return
+            if woke and self._edge_time is not None and self.debounce > 0:
+                level = self._settle()
+            else:
+                level = self.driver.read(self.sensor_pin)
+            t_edge, self._edge_time = self._edge_time, None
+            present = level == self.present_level
+            latency = None
+            with self._lock:
+                changed = present != self.present
+                self.present = present
+                if present:
+                    self.paused = False
+                elif self.armed and not self.paused:
+                    if self.pause_pin is not None:
+                        self.driver.write(self.pause_pin, True)
+                    self.paused = True
+                    t = time.perf_counter()
+                    latency = t - t_edge if t_edge is not None else 0.0
+                    self.last_latency = latency
+                    changed = True
+            if changed:
+                self._events.put((present, latency))
+
+
+def measure_pause_latency(trials=50, debounce=0.05, bounce=0.0,
+                          load_threads=0, gap=0.2):
+    # Pulls the filament on a simulated sensor `trials` times (with
+    # `bounce` seconds of contact chatter) while load_threads busy threads
+    # stand in for the vision load, and returns the edge-to-pause-pin
+    # latencies in seconds.
+    driver = SimulatedDriver({FILAMENT_SENSOR_PIN: False})
+    watcher = FilamentWatcher(driver, debounce=debounce).start()
+    watcher.arm()
+    stop = threading.Event()
+
+    def busy():
+        a = np.random.rand(256, 256).astype(np.float32)
+        while not stop.is_set():
+            a = a @ a
+            a /= np.abs(a).max() + 1
+
+    workers = [threading.Thread(target=busy, daemon=True)
+               for _ in range(load_threads)]
+    for w in workers:
+        w.start()
+    latencies = []
+    try:
+        time.sleep(gap)
+        for _ in range(trials):
+            n = len(driver.writes)
+            t0 = time.perf_counter()
+            if bounce > 0:
+                end = t0 + bounce
+                level = True
+                while time.perf_counter() < end:
+                    driver.set_input(FILAMENT_SENSOR_PIN, level)
+                    level = not level
+                    time.sleep(0.002)
+            driver.set_input(FILAMENT_SENSOR_PIN, True)  # ran out
+            deadline = t0 + 5.0
+            while len(driver.writes) == n and time.perf_counter() < deadline:
+                time.sleep(0.0005)
+            if len(driver.writes) == n:
+                raise RuntimeError("printer was not paused within 5 s")
+            latencies.append(driver.writes[-1][2] - t0)
+            driver.set_input(FILAMENT_SENSOR_PIN, False)  # reloaded
+            time.sleep(gap)
+            watcher.events()
+    finally:
+        stop.set()
+        watcher.stop()
+    return np.array(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure filament run-out to printer pause latency on "
+                    "a simulated sensor, optionally under CPU load.")
+    parser.add_argument("--trials", type=int, default=50)
+    parser.add_argument("--debounce", type=float, default=0.05)
+    parser.add_argument("--bounce", type=float, default=0.0,
+                        help="seconds of contact chatter before the edge")
+    parser.add_argument("--load", type=int, default=0,
+                        help="busy threads standing in for inference")
+    args = parser.parse_args()
+
+    lat = measure_pause_latency(args.trials, args.debounce, args.bounce,
+                                args.load) * 1000
+    p = np.percentile(lat, [50, 90, 99])
+    print(f"{len(lat)} run-outs, debounce {args.debounce * 1000:.0f} ms, "
+          f"{args.load} load threads: p50 {p[0]:.1f} ms  p90 {p[1]:.1f} ms  "
+          f"p99 {p[2]:.1f} ms  max {lat.max():.1f} ms")
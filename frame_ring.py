@@ -0,0 +1,98 @@
+import io
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    # The last `seconds` of small preview frames and their masks, sampled at
+    # `fps`. Slots are allocated once on the first push, so memory stays
+    # fixed however long the print runs; a push is one copy into a slot.
+
+    def __init__(self, seconds=10.0, fps=4.0):
+        self.seconds = seconds
+        self.fps = fps
+        self.capacity = max(int(round(seconds * fps)), 1)
+        self.frames = None
+        self.masks = None
+        self.times = np.zeros(self.capacity, np.float64)
+        self._count = 0
+        self._next = 0.0
+
+    def reset(self):
+        self._count = 0
+        self._next = 0.0
+
+    @property
+    def nbytes(self):
+        if self.frames is None:
+            return 0
+        return self.frames.nbytes + self.masks.nbytes
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def push(self, frame, mask=None, now=None):
+        # frame: BGR image at ring resolution; mask: optional (rect, mask)
+        # in the same coordinates. Returns False when not due yet.
+        now = time.time() if now is None else now
+        if now < self._next:
+            return False
+        self._next = now + 1.0 / self.fps
+        if self.frames is None or self.frames.shape[1:] != frame.shape:
+            self.frames = np.empty((self.capacity,) + frame.shape, np.uint8)
+            self.masks = np.empty(
+                (self.capacity,) + frame.shape[:2], np.uint8)
+            self._count = 0
+        i = self._count % self.capacity
+        np.copyto(self.frames[i], frame)
+        slot = self.masks[i]
+        slot.fill(0)
+        if mask is not None:
+            (x, y, rw, rh), m = mask
+            region = slot[y: y + rh, x: x + rw]
+            np.copyto(region, m[: region.shape[0], : region.shape[1]])
+        self.times[i] = now
+        self._count += 1
+        return True
+
+    def snapshot(self):
+        # Oldest-first copies of (frames, masks, times), detached from the
+        # slots so encoding can run elsewhere while the ring keeps filling
+        n = len(self)
+        if n == 0:
+            return None
+        start = self._count % self.capacity if self._count > n else 0
+        order = (np.arange(n) + start) % self.capacity
+        return self.frames[order], self.masks[order], self.times[order]
+
+
+def encode_gif(frames, masks, times, tint_bgr=(201, 252, 157),
+               blend_alpha=0.4, alert_time=None):
+    # Animated GIF of a snapshot with the masks tinted in and each frame
+    # labelled with its time relative to the alert
+    from PIL import Image
+
+    alert_time = times[-1] if alert_time is None else alert_time
+    tint = np.empty_like(frames[0])
+    tint[:] = tint_bgr
+    images = []
+    for frame, mask, t in zip(frames, masks, times):
+        tinted = cv2.addWeighted(frame, 1 - blend_alpha, tint,
+                                 blend_alpha, 0)
+        np.copyto(tinted, frame, where=(mask[:, :, None] == 0))
+        cv2.putText(tinted, f"{t - alert_time:+.1f} s", (6, 18),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        images.append(Image.fromarray(
+            cv2.cvtColor(tinted, cv2.COLOR_BGR2RGB)).convert(
+                "P", palette=Image.ADAPTIVE))
+    # each frame stays up until the next one was taken; the last for the
+    # typical gap
+    last = np.median(np.diff(times)) if len(times) > 1 else 0.5
+    durations = np.diff(times, append=times[-1] + last)
+    buf = io.BytesIO()
+    images[0].save(buf, format="GIF", save_all=True,
+                   append_images=images[1:], loop=0,
+                   duration=[max(int(d * 1000), 20) for d in durations])
+    return buf.getvalue()
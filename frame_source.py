@@ -0,0 +1,60 @@
+import os
+
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def iter_frames(path, limit=None):
+    # Recorded frames from a video file or a directory of images (sorted
+    # by file name), as BGR arrays like cv2.VideoCapture.read() returns.
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path)
+                       if n.lower().endswith(IMAGE_EXTENSIONS))
+        count = 0
+        for name in names:
+            if limit is not None and count >= limit:
+                return
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is None:
+                print(f"Skipping unreadable image {name}")
+                continue
+            count += 1
+            yield frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video {path}")
+    try:
+        count = 0
+        while limit is None or count < limit:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            count += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def source_fps(path):
+    # Frame rate stored in a video file; None for image directories or when
+    # the container does not say
+    if os.path.isdir(path):
+        return None
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    finally:
+        cap.release()
+    return fps if fps and fps > 0 else None
+
+
+def load_frames(path, limit=None):
+    return list(iter_frames(path, limit))
+
+
+def parse_roi(text):
+    x, y, w, h = (int(v) for v in text.split(","))
+    return x, y, w, h
@@ -0,0 +1,339 @@
+import argparse
+import hmac
+import json
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from supervisor import MINT_BGR, ALERT_BGR, MonitorSupervisor, alerts_from_config
+
+BOUNDARY = "frame"
+INDEX_HTML = """<html>
+  <head><title>Printer Monitor</title></head>
+  <body>
+    {images}
+    <p><a href="/status">status</a></p>
+  </body>
+</html>
+"""
+
+
+class PreviewEncoder:
+    # Turns each printer's latest frame into a JPEG with the mask overlay.
+    # The encoder thread sleeps while no stream client is connected, so an
+    # idle node spends no CPU on JPEG encoding; with clients connected every
+    # frame is encoded once and shared between them.
+
+    def __init__(self, sources, fps=5.0, width=640, jpeg_quality=70):
+        self.sources = {src.name: src for src in sources}
+        self.interval = 1.0 / fps if fps else 0.0
+        self.width = width
+        self.jpeg_quality = jpeg_quality
+        self.encoded_frames = 0
+
+        self._cond = threading.Condition()
+        self._clients = 0
+        self._jpegs = {}  # name -> (sequence, bytes)
+        self._buffers = {}
+        self._encoded = {}  # name -> frame the current JPEG was made from
+        self._running = False
+        self._thread = None
+
+    @property
+    def clients(self):
+        return self._clients
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="preview-encoder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def connect(self):
+        with self._cond:
+            self._clients += 1
+            self._cond.notify_all()
+
+    def disconnect(self):
+        with self._cond:
+            self._clients -= 1
+
+    def wait_frame(self, name, last_seq, timeout=5.0):
+        # Blocks until a JPEG newer than last_seq exists; returns
+        # (sequence, bytes), or None on timeout or shutdown.
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self._running
+                or self._jpegs.get(name, (last_seq,))[0] != last_seq,
+                timeout)
+            if not self._running:
+                return None
+            return self._jpegs.get(name)
+
+    def _run(self):
+        seq = 0
+        while True:
+            with self._cond:
+                while self._running and self._clients == 0:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            t0 = time.perf_counter()
+            seq += 1
+            for name, src in self.sources.items():
+                jpeg = self._encode(src)
+                if jpeg is not None:
+                    with self._cond:
+                        self._jpegs[name] = (seq, jpeg)
+                        self._cond.notify_all()
+            wait = self.interval - (time.perf_counter() - t0)
+            if wait > 0:
+                time.sleep(wait)
+
+    def _encode(self, src):
+        frame = src.frame
+        if frame is None or frame is self._encoded.get(src.name):
+            return None
+        self._encoded[src.name] = frame
+        fh, fw = frame.shape[:2]
+        f = min(self.width / fw, 1.0)
+        size = (int(fw * f), int(fh * f))
+        buf = self._buffers.get(src.name)
+        if buf is None or buf.shape[:2] != size[::-1]:
+            buf = self._buffers[src.name] = np.empty(
+                (size[1], size[0], 3), np.uint8)
+        cv2.resize(frame, size, buf, interpolation=cv2.INTER_AREA)
+        disp = src.monitor.draw_overlay(buf, f, f)
+        color = ALERT_BGR if src.monitor.alert else MINT_BGR
+        cv2.putText(disp, f"{src.name}  Diff: {src.db:.1f}% / "
+                    f"{src.monitor.sensitivity}%", (6, 18),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+        ok, jpeg = cv2.imencode(
+            ".jpg", disp, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return None
+        self.encoded_frames += 1
+        return jpeg.tobytes()
+
+
+def printer_status(src):
+    monitor = src.monitor
+    return {
+        "db": round(float(src.db), 2),
+        "sensitivity": monitor.sensitivity,
+        "abnormal_count": monitor.abnormal_count,
+        "consecutive_threshold": monitor.consecutive_threshold,
+        "alert": monitor.alert,
+        "alerts": src.alerts,
+        "frames": src.frames,
+        "latency_ms": round(src.latency_ms, 1),
+        "paused_by_alert": src.paused_by_alert,
+        "paused_by_filament": src.paused_by_filament,
+        "filament_present": src.filament_present,
+        "degraded": src.degraded,
+        "errors": src.errors,
+        "last_error": src.last_error,
+        "regions": {r.name: {"db": round(r.db, 2),
+                             "abnormal_count": r.abnormal_count,
+                             "alert": r.alert}
+                    for r in src.regions if not r.exclude},
+    }
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _source(self, path, prefix):
+        supervisor = self.server.supervisor
+        name = path[len(prefix):].strip("/")
+        if not name:
+            return supervisor.sources[0]
+        for src in supervisor.sources:
+            if src.name == name:
+                return src
+        return None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        supervisor = self.server.supervisor
+        if path == "/":
+            images = "\n    ".join(
+                f'<h3>{src.name}</h3><img src="/stream/{src.name}">'
+                for src in supervisor.sources)
+            self._send(200, "text/html; charset=utf-8",
+                       INDEX_HTML.format(images=images).encode("utf-8"))
+        elif path == "/status":
+            status = {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "gpio": supervisor.gpio.name,
+                "preview_clients": self.server.encoder.clients,
+                "printers": {src.name: printer_status(src)
+                             for src in supervisor.sources},
+            }
+            self._send(200, "application/json",
+                       json.dumps(status).encode("utf-8"))
+        elif path.startswith("/stream"):
+            src = self._source(path, "/stream")
+            if src is None:
+                self._send(404, "text/plain", b"Unknown printer\n")
+                return
+            self._stream(src)
+        else:
+            self._send(404, "text/plain", b"Not found\n")
+
+    def do_POST(self):
+        # POST /resume/<name> clears a pause set by a motion alert; only with
+        # "Authorization: Bearer <resume_token>", and never without a token
+        path = self.path.split("?", 1)[0]
+        if not path.startswith("/resume"):
+            self._send(404, "text/plain", b"Not found\n")
+            return
+        token = self.server.resume_token
+        if not token:
+            self._send(403, "text/plain", b"Resume is not enabled\n")
+            return
+        given = self.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode("utf-8"),
+                                   f"Bearer {token}".encode("utf-8")):
+            self._send(401, "text/plain", b"Missing or wrong token\n")
+            return
+        src = self._source(path, "/resume")
+        if src is None:
+            self._send(404, "text/plain", b"Unknown printer\n")
+            return
+        self.server.supervisor.resume(src.name)
+        self._send(200, "application/json",
+                   json.dumps(printer_status(src)).encode("utf-8"))
+
+    def _stream(self, src):
+        encoder = self.server.encoder
+        self.send_response(200)
+        self.send_header("Content-Type",
+                         f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        encoder.connect()
+        seq = None
+        try:
+            while True:
+                item = encoder.wait_frame(src.name, seq)
+                if item is None:
+                    if not self.server.running:
+                        return
+                    continue
+                seq, jpeg = item
+                self.wfile.write(
+                    f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii"))
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            encoder.disconnect()
+
+
+class StatusServer(ThreadingHTTPServer):
+    # Local HTTP endpoint for a headless node:
+    #   /            HTML page with one MJPEG preview per printer
+    #   /status      JSON with db, alert and filament state per printer
+    #   /stream/NAME MJPEG preview (the first printer if NAME is omitted)
+    #   POST /resume/NAME  clear a pause set by a motion alert; needs
+    #                      resume_token, sent as "Authorization: Bearer ..."
+    # Binds to localhost unless another host is given.
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, supervisor, encoder, host="127.0.0.1", port=8080,
+                 resume_token=None):
+        super().__init__((host, port), _StatusHandler)
+        self.supervisor = supervisor
+        self.encoder = encoder
+        self.resume_token = resume_token
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self.encoder.start()
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="status-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.encoder.stop()
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the printer monitor without a display. Takes the "
+                    "same JSON config as supervisor.py (a 'printers' list "
+                    "with camera, roi or regions, sensitivity, "
+                    "consecutive_threshold and pins, plus optional "
+                    "'email'), and an optional "
+                    "'http' section with host (default 127.0.0.1), port, "
+                    "fps, width, jpeg_quality and resume_token (required "
+                    "for POST /resume) for the status endpoint.")
+    parser.add_argument("config", help="JSON config file")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    http = config.get("http", {})
+    dispatcher, on_alert = alerts_from_config(config)
+    supervisor = MonitorSupervisor.from_config(config, on_alert=on_alert)
+    encoder = PreviewEncoder(
+        supervisor.sources, fps=http.get("fps", 5.0),
+        width=http.get("width", 640),
+        jpeg_quality=http.get("jpeg_quality", 70))
+    server = StatusServer(supervisor, encoder, http.get("host", "127.0.0.1"),
+                          http.get("port", 8080),
+                          http.get("resume_token")).start()
+    print(f"Status on http://{server.server_address[0]}:"
+          f"{server.server_address[1]}/")
+    # a service stop (SIGTERM) or hangup ends the run like Ctrl+C, so the
+    # diff logs are flushed and the cameras and pins released
+    for sig in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(sig, lambda signum, frame: supervisor.stop())
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        supervisor.stop()
+    finally:
+        server.stop()
+        if dispatcher is not None:
+            dispatcher.stop()
+        if not supervisor.gpio.simulated:
+            supervisor.gpio.cleanup()
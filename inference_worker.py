@@ -0,0 +1,231 @@
+import threading
+import time
+
+_UNCHANGED = object()  # InferenceWorker.reset() without new regions
+
+
+class RateCounter:
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.fps = 0.0
+        self._last = None
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last is not None and now > self._last:
+            fps = 1.0 / (now - self._last)
+            if self.fps == 0:
+                self.fps = fps
+            else:
+                self.fps = self.smoothing * self.fps + \
+                    (1 - self.smoothing) * fps
+        self._last = now
+
+    def reset(self):
+        self.fps = 0.0
+        self._last = None
+
+
+class AdaptiveRate:
+    # Decides how often a frame goes to the detector. The ceiling is
+    # target_fps, lowered so that the measured per-frame cost stays within
+    # cpu_budget (a fraction of one core) when that is set. After the scene
+    # has been stable for stable_after seconds the rate decays towards
+    # min_fps by `backoff` per second; as soon as db reaches `rise` times
+    # the sensitivity it jumps back to the ceiling.
+
+    def __init__(
+        self,
+        target_fps=5.0,
+        cpu_budget=None,
+        min_fps=0.5,
+        stable_after=60.0,
+        backoff=0.9,
+        rise=0.5,
+        smoothing=0.9,
+    ):
+        self.target_fps = target_fps
+        self.cpu_budget = cpu_budget
+        self.min_fps = min_fps
+        self.stable_after = stable_after
+        self.backoff = backoff
+        self.rise = rise
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.cost = None
+        self.fps = self.ceiling()
+        self.stable = False
+        self._stable_since = None
+        self._last = None
+        self._next = 0.0
+
+    def ceiling(self):
+        fps = self.target_fps if self.target_fps else float("inf")
+        if self.cpu_budget and self.cost:
+            fps = min(fps, self.cpu_budget / self.cost)
+        if fps == float("inf"):
+            fps = 30.0
+        return max(fps, self.min_fps)
+
+    def observe(self, cost, db, sensitivity, now=None):
+        # cost: seconds the detector spent on the frame that produced db
+        now = time.perf_counter() if now is None else now
+        if self.cost is None:
+            self.cost = cost
+        else:
+            self.cost = self.smoothing * self.cost + \
+                (1 - self.smoothing) * cost
+        ceiling = self.ceiling()
+        if db >= self.rise * sensitivity:
+            self._stable_since = None
+            self.stable = False
+            self.fps = ceiling
+        else:
+            if self._stable_since is None:
+                self._stable_since = now
+            self.stable = now - self._stable_since >= self.stable_after
+            if self.stable and self._last is not None:
+                self.fps *= self.backoff ** (now - self._last)
+            self.fps = min(max(self.fps, self.min_fps), ceiling)
+        self._last = now
+
+    def due(self, now=None):
+        # True when the next frame should go to the detector
+        now = time.perf_counter() if now is None else now
+        if now < self._next:
+            return False
+        # counted from now rather than the missed slot, so a slow display
+        # loop never makes frames go out in bursts
+        self._next = now + 1.0 / self.fps
+        return True
+
+
+class InferenceWorker:
+    # Runs Monitor.analyze on its own thread. Frames go through a single
+    # slot: a new frame replaces one that has not been picked up yet
+    # ("latest frame wins"), so the GUI never waits on the model.
+
+    def __init__(self, monitor, on_result=None):
+        self.monitor = monitor
+        # called on the worker thread for every analysed frame as
+        # on_result(monitor, alert_triggered, db), e.g. to log diff metrics
+        self.on_result = on_result
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.inference_rate = RateCounter()
+        self.last_cost = 0.0  # seconds spent in analyze() on the last frame
+        # capture to decision, for frames submitted with a capture timestamp
+        self.last_latency = None
+        self.latency_ms = 0.0  # smoothed
+
+        self._cond = threading.Condition()
+        self._slot = None
+        self._result = None
+        self._generation = 0
+        self._monitor_generation = 0
+        self._regions = _UNCHANGED  # applied with the next monitor reset
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="inference-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def reset(self, regions=_UNCHANGED):
+        # Drop pending work; the monitor itself is reset on the worker thread
+        # before the next frame so it never races an in-flight analyze().
+        # regions (a list of Region, or None for the single ROI) replaces the
+        # monitor's regions at that same point.
+        with self._cond:
+            if regions is not _UNCHANGED:
+                self._regions = regions
+            self._slot = None
+            self._result = None
+            self._generation += 1
+            self.inference_rate.reset()
+
+    def submit(self, frame, roi_canvas, sx, sy, ts=None):
+        # ts: time.perf_counter() when the frame was captured
+        with self._cond:
+            if self._slot is not None:
+                self.dropped_frames += 1
+            self._slot = (frame, roi_canvas, sx, sy, ts)
+            self._cond.notify()
+
+    def poll(self):
+        # Returns (frame, alert_triggered, db) for the newest finished frame
+        # since the last poll, or None.
+        with self._cond:
+            result, self._result = self._result, None
+        return result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._slot is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, roi_canvas, sx, sy, ts = self._slot
+                self._slot = None
+                generation = self._generation
+                regions, self._regions = self._regions, _UNCHANGED
+
+            if regions is not _UNCHANGED:
+                try:
+                    self.monitor.set_regions(regions)
+                except ValueError as e:
+                    print(f"Error setting regions: {e}")
+            if generation != self._monitor_generation:
+                self.monitor.reset()
+                self._monitor_generation = generation
+
+            t0 = time.perf_counter()
+            try:
+                alert_triggered, db = self.monitor.analyze(
+                    frame, roi_canvas, sx, sy)
+            except Exception as e:
+                print(f"Error during inference: {e}")
+                continue
+            t1 = time.perf_counter()
+            cost = t1 - t0
+            latency = t1 - ts if ts is not None else None
+            if latency is not None and self.monitor.profiler is not None:
+                self.monitor.profiler.record("latency", latency)
+            if self.on_result is not None:
+                try:
+                    self.on_result(self.monitor, alert_triggered, db)
+                except Exception as e:
+                    print(f"Error in result callback: {e}")
+
+            with self._cond:
+                if generation != self._generation:
+                    continue
+                self.last_cost = cost
+                if latency is not None:
+                    self.last_latency = latency
+                    self.latency_ms = latency * 1000 if not self.latency_ms \
+                        else 0.9 * self.latency_ms + 100 * latency
+                self.processed_frames += 1
+                self.inference_rate.tick()
+                pending = self._result
+                if pending is not None and pending[1] and not alert_triggered:
+                    # keep an alert the GUI has not picked up yet
+                    self._result = (pending[0], True, db)
+                else:
+                    self._result = (frame, alert_triggered, db)
@@ -0,0 +1,312 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# rembg and PIL pull in a large dependency tree; they are imported only when
+# a session has to be built by rembg or the rembg backend is used.
+
+# optimised ONNX graphs saved on the first run and loaded directly afterwards
+SESSION_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "printer-monitor")
+# fp16 and int8 model files written by quantize_models.py; both it and
+# load_session use PRINTER_MONITOR_MODEL_DIR instead when that is set
+MODEL_DIR_ENV = "PRINTER_MONITOR_MODEL_DIR"
+MODEL_DIR = os.environ.get(MODEL_DIR_ENV) or os.path.join(
+    SESSION_CACHE_DIR, "models")
+
+# fp32 is the original rembg model; the others are variants of it:
+# fp16 weights, int8 with dynamic activation ranges, and int8 with ranges
+# calibrated on recorded frames
+PRECISIONS = ("fp32", "fp16", "int8", "int8-static")
+
+# (mean, std, input size) used by rembg's own preprocessing for each model
+MODEL_SPECS = {
+    "u2net": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "u2netp": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "u2net_human_seg": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "silueta": ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), 320),
+    "isnet-general-use": ((0.5, 0.5, 0.5), (1.0, 1.0, 1.0), 1024),
+    "isnet-anime": ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), 1024),
+}
+
+
+class DirectSession:
+    # Stands in for a rembg session when the graph is loaded straight into
+    # ONNX Runtime (from the session cache or a reduced-precision variant);
+    # the engines only use inner_session.
+
+    def __init__(self, model_name, inner_session, path):
+        self.model_name = model_name
+        self.inner_session = inner_session
+        self.path = path
+
+
+def variant_path(model_name, precision, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{model_name}-{precision}.onnx")
+
+
+def _cache_path(name, cache_dir):
+    import onnxruntime as ort
+    # optimised graphs are specific to the runtime version and the machine
+    return os.path.join(cache_dir, f"{name}-ort{ort.__version__}.onnx")
+
+
+def _ort_session(path, opts=None):
+    import onnxruntime as ort
+    return ort.InferenceSession(path, opts,
+                                providers=["CPUExecutionProvider"])
+
+
+def load_session(model_name, cache_dir=SESSION_CACHE_DIR, precision="fp32",
+                 model_dir=MODEL_DIR):
+    # Loads the optimised graph saved by an earlier run if there is one,
+    # skipping rembg and graph optimisation; otherwise builds the session
+    # (through rembg for fp32, from the variant file otherwise) and saves
+    # the optimised graph for next time.
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'")
+    source = None
+    if precision != "fp32":
+        source = variant_path(model_name, precision, model_dir)
+        if not os.path.exists(source):
+            raise FileNotFoundError(
+                f"No {precision} variant of '{model_name}' at {source}; "
+                f"create it with quantize_models.py, or point "
+                f"{MODEL_DIR_ENV} at its --out-dir")
+    if cache_dir is None:
+        if source is not None:
+            return DirectSession(model_name, _ort_session(source), source)
+        from rembg import new_session
+        return new_session(model_name)
+
+    import onnxruntime as ort
+    name = model_name if source is None else f"{model_name}-{precision}"
+    path = _cache_path(name, cache_dir)
+    if os.path.exists(path) and (
+            source is None or os.path.getmtime(path) >= os.path.getmtime(source)):
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = \
+            ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return DirectSession(model_name, _ort_session(path, opts), path)
+        except Exception as e:
+            print(f"Ignoring cached session {path}: {e}")
+            os.remove(path)
+
+    opts = ort.SessionOptions()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        opts.optimized_model_filepath = path
+    except OSError as e:
+        print(f"Session cache disabled: {e}")
+    if source is not None:
+        return DirectSession(model_name, _ort_session(source, opts), source)
+    from rembg import new_session
+    return new_session(model_name, sess_opts=opts)
+
+
+class RembgMaskEngine:
+    # The original path: BGR -> RGB -> PIL -> rembg.remove -> RGBA -> alpha
+
+    def __init__(self, model_name, session=None, precision="fp32"):
+        from rembg import new_session
+        if precision != "fp32":
+            raise ValueError("The rembg backend only runs fp32 models; use "
+                             "the onnx backend for other precisions")
+        self.model_name = model_name
+        self.session = session if session is not None else new_session(
+            model_name)
+
+    def prepare(self, bgr):
+        from PIL import Image
+        return Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+
+    def predict(self, prepared, out_size=None, out=None):
+        from rembg import remove
+        alpha = np.array(remove(prepared, session=self.session))[:, :, 3]
+        if out is None:
+            return alpha
+        np.copyto(out, alpha)
+        return out
+
+    def alpha(self, bgr, out=None):
+        return self.predict(self.prepare(bgr), out=out)
+
+    def alpha_batch(self, crops):
+        return [self.alpha(bgr) for bgr in crops]
+
+    def warmup(self, size=None):
+        w, h = size or (320, 320)
+        self.alpha(np.zeros((h, w, 3), np.uint8))
+
+
+class OnnxMaskEngine:
+    # Feeds the rembg session's ONNX graph directly. The input tensor and
+    # every intermediate buffer are allocated once and reused per frame.
+
+    def __init__(self, model_name, session=None, precision="fp32"):
+        if model_name not in MODEL_SPECS:
+            raise ValueError(
+                f"Model '{model_name}' is not supported by the onnx backend")
+        self.model_name = model_name
+        self.precision = precision
+        self.session = session if session is not None else load_session(
+            model_name, precision=precision)
+        inner = self.session.inner_session
+        self.input_name = inner.get_inputs()[0].name
+        self.output_name = inner.get_outputs()[0].name
+
+        mean, std, size = MODEL_SPECS[model_name]
+        self.size = size
+        self._mean = mean
+        self._std = std
+        self._resized = np.empty((size, size, 3), np.uint8)
+        self._tensor = np.empty((1, 3, size, size), np.float32)
+        self._pred = np.empty((1, 1, size, size), np.float32)
+        self._mask = np.empty((size, size), np.uint8)
+        self._alpha = {}
+
+        self._binding = self._bind(self._tensor, self._pred)
+
+        # models exported with a fixed batch dimension can only run one image
+        batch_dim = inner.get_inputs()[0].shape[0]
+        self.max_batch = batch_dim if isinstance(batch_dim, int) else None
+        self._batches = {}
+
+    def _bind(self, tensor, pred):
+        # bind the preallocated input once; only the mask output is fetched
+        binding = self.session.inner_session.io_binding()
+        binding.bind_cpu_input(self.input_name, tensor)
+        binding.bind_output(
+            self.output_name, "cpu", 0, np.float32, pred.shape,
+            pred.ctypes.data)
+        return binding
+
+    def _fill(self, bgr, chw):
+        cv2.resize(bgr, (self.size, self.size), dst=self._resized,
+                   interpolation=cv2.INTER_AREA)
+        # same scaling as rembg: x / max(x), then per-channel (x - mean) / std
+        scale = 1.0 / max(int(self._resized.max()), 1)
+        for c in range(3):
+            plane = chw[c]
+            # the model expects RGB, the frame is BGR
+            np.multiply(self._resized[:, :, 2 - c], scale / self._std[c],
+                        out=plane, casting="unsafe")
+            np.subtract(plane, self._mean[c] / self._std[c], out=plane)
+
+    def _output(self, pred, out_size, out, key=0):
+        cv2.normalize(pred, self._mask, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+        w, h = out_size
+        if out is None:
+            # one buffer per ROI shape (and batch slot), so Monitors sharing
+            # this engine do not reallocate on every call
+            out = self._alpha.get((key, h, w))
+            if out is None:
+                if len(self._alpha) >= 32:
+                    self._alpha.clear()
+                out = self._alpha[(key, h, w)] = np.empty((h, w), np.uint8)
+        cv2.resize(self._mask, (w, h), dst=out,
+                   interpolation=cv2.INTER_LINEAR)
+        return out
+
+    def prepare(self, bgr):
+        self._fill(bgr, self._tensor[0])
+        return self._tensor
+
+    def predict(self, prepared, out_size, out=None):
+        self.session.inner_session.run_with_iobinding(self._binding)
+        return self._output(self._pred[0, 0], out_size, out)
+
+    def alpha(self, bgr, out=None):
+        h, w = bgr.shape[:2]
+        return self.predict(self.prepare(bgr), (w, h), out)
+
+    def warmup(self, size=None):
+        # First runs are slow while ONNX Runtime sets up its kernels and
+        # memory arenas; do one on a dummy tensor before monitoring starts
+        self._tensor.fill(0)
+        self.predict(self._tensor, size or (self.size, self.size))
+
+    def alpha_batch(self, crops):
+        # One forward pass over an NCHW batch; masks come back in order
+        n = len(crops)
+        if n == 1 or (self.max_batch is not None and n != self.max_batch):
+            return [self.alpha(bgr).copy() for bgr in crops]
+        if n not in self._batches:
+            tensor = np.empty((n, 3, self.size, self.size), np.float32)
+            pred = np.empty((n, 1, self.size, self.size), np.float32)
+            self._batches[n] = (tensor, pred, self._bind(tensor, pred))
+        tensor, pred, binding = self._batches[n]
+
+        for i, bgr in enumerate(crops):
+            self._fill(bgr, tensor[i])
+        self.session.inner_session.run_with_iobinding(binding)
+        masks = []
+        for i, bgr in enumerate(crops):
+            h, w = bgr.shape[:2]
+            masks.append(self._output(pred[i, 0], (w, h), None, key=i + 1))
+        return masks
+
+
+MASK_BACKENDS = {
+    "rembg": RembgMaskEngine,
+    "onnx": OnnxMaskEngine,
+}
+
+
+def create_mask_engine(backend, model_name, session=None, precision="fp32"):
+    if backend not in MASK_BACKENDS:
+        raise ValueError(f"Unknown mask backend '{backend}'")
+    return MASK_BACKENDS[backend](model_name, session=session,
+                                  precision=precision)
+
+
+class ModelLoader:
+    # Builds and warms up a mask engine on a background thread so the GUI
+    # and camera can come up meanwhile. Poll `done`, then use `engine` (or
+    # `error` if loading failed). load_s and warmup_s are the timings.
+
+    def __init__(self, backend, model_name, warmup_size=None,
+                 precision="fp32"):
+        self.backend = backend
+        self.model_name = model_name
+        self.precision = precision
+        self.warmup_size = warmup_size
+        self.engine = None
+        self.error = None
+        self.load_s = None
+        self.warmup_s = None
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="model-loader", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.engine
+
+    def _run(self):
+        try:
+            t0 = time.perf_counter()
+            engine = create_mask_engine(self.backend, self.model_name,
+                                        precision=self.precision)
+            t1 = time.perf_counter()
+            engine.warmup(self.warmup_size)
+            t2 = time.perf_counter()
+            self.load_s, self.warmup_s = t1 - t0, t2 - t1
+            self.engine = engine
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# seconds; covers a fast GPIO read up to a slow full-frame inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class StageHistogram:
+    # Cumulative bucket counts for Prometheus, plus a ring of the most
+    # recent samples for rolling percentiles.
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._recent = np.zeros(window, np.float64)
+        self._n = 0
+
+    def observe(self, seconds):
+        i = 0
+        for bound in self.buckets:
+            if seconds <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        self._recent[self._n % len(self._recent)] = seconds
+        self._n += 1
+
+    def recent(self):
+        return self._recent[:min(self._n, len(self._recent))]
+
+
+class Metrics:
+    # Per-stage timings and counters for the monitoring loop. record() has
+    # the profiler signature Monitor expects, so an instance can be set as
+    # Monitor.profiler. Counters that already live elsewhere (worker,
+    # monitor, dispatcher) are read by collectors only when metrics are
+    # exported, so they cost nothing per frame.
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024,
+                 prefix="printer_monitor"):
+        self.buckets = buckets
+        self.window = window
+        self.prefix = prefix
+        self.started = time.time()
+        self._stages = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = StageHistogram(
+                    self.buckets, self.window)
+            hist.observe(seconds)
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def add_collector(self, collect):
+        # collect() returns {name: value}; names ending in _total are
+        # exported as counters, everything else as gauges
+        self._collectors.append(collect)
+
+    def values(self):
+        with self._lock:
+            values = dict(self._counters)
+        for collect in self._collectors:
+            values.update(collect())
+        return values
+
+    def snapshot(self):
+        # JSON-friendly view with rolling percentiles in milliseconds
+        stages = {}
+        with self._lock:
+            for stage, hist in self._stages.items():
+                ms = hist.recent() * 1000
+                stages[stage] = {
+                    "count": hist.count,
+                    "mean_ms": hist.sum / hist.count * 1000,
+                    "p50_ms": float(np.percentile(ms, 50)),
+                    "p95_ms": float(np.percentile(ms, 95)),
+                    "p99_ms": float(np.percentile(ms, 99)),
+                }
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "uptime_s": round(time.time() - self.started, 1),
+            "stages": stages,
+            "values": self.values(),
+        }
+
+    def prometheus(self):
+        p = self.prefix
+        lines = [f"# TYPE {p}_stage_seconds histogram"]
+        with self._lock:
+            for stage, hist in sorted(self._stages.items()):
+                total = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    total += n
+                    lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",'
+                                 f'le="{bound}"}} {total}')
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",'
+                             f'le="+Inf"}} {hist.count}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} '
+                             f'{hist.sum:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} '
+                             f'{hist.count}')
+        for name, value in sorted(self.values().items()):
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            lines.append(f"{p}_{name} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PrometheusExporter(ThreadingHTTPServer):
+    # Serves /metrics in the Prometheus text format on a local port.
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, metrics, host="127.0.0.1", port=9108):
+        super().__init__((host, port), _MetricsHandler)
+        self.metrics = metrics
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class JsonLogExporter:
+    # Appends one JSON snapshot per interval to a log file (one per line).
+
+    def __init__(self, metrics, path, interval=60.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-log", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.write()
+
+    def write(self):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.metrics.snapshot()) + "\n")
+        except OSError as e:
+            print(f"Error writing metrics log: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
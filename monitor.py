@@ -1,7 +1,10 @@
+import time
+
 import cv2
 import numpy as np
-from rembg import remove, new_session
-from PIL import Image
+
+from mask_engine import create_mask_engine
+from regions import RegionSet
 
 
 class Monitor:
@@ -28,6 +31,37 @@ class Monitor:
 
         # isnet-general-use: 일반적으로 사용되는 새로운 모델로, 향상된 성능을 제공할 수 있습니다. (A newer general-use model that may offer improved performance.)
 
+        backend="rembg",
+        # rembg: rembg.remove()를 그대로 사용 (Original rembg.remove() path through PIL.)
+        # onnx: 같은 모델을 ONNX Runtime으로 직접 실행, PIL 변환 없음 (Runs the same model directly on ONNX Runtime with preallocated buffers, no PIL round trip.)
+
+        roi_only=False,
+        roi_padding=16,
+        motion_gate=None,
+        engine=None,
+        infer_scale=1.0,
+        # roi_only: ROI(+여백) 영역만 분할합니다. (Segment only the ROI plus a padding margin instead of the whole frame.)
+        # roi_padding: ROI 주변에 모델에 보여줄 여백 픽셀 수 (Pixels of context kept around the ROI for the model.)
+        # motion_gate: MotionGate 객체, ROI가 정지해 있으면 분할을 건너뜁니다. (Optional MotionGate; skips segmentation while the ROI is static.)
+        # engine: 여러 Monitor가 하나의 모델을 공유할 때 사용 (Existing mask engine to share one loaded model between several Monitors.)
+        # infer_scale: 추론 전에 이미지를 축소하는 비율, 예: 0.5 (Downscale factor applied before inference, e.g. 0.5; masks are upsampled only for the overlay.)
+
+        precision="fp32",
+        # fp32: 원본 모델 (The original model.)
+        # fp16, int8, int8-static: quantize_models.py로 만든 경량 모델, onnx 백엔드 전용 (Reduced-precision variants made by quantize_models.py, onnx backend only; e.g. int8-static u2net on a Pi 3/4 instead of u2netp. Check alert agreement with bench.py --precisions first.)
+
+        regions=None,
+        # regions: 이름이 있는 여러 감시 영역과 제외 영역(Region 목록), 각각 감도와 연속 횟수를 따로 가짐 (List of named Regions, each with its own sensitivity and count, plus exclusion zones; the ROI becomes their bounding box and is segmented once per frame.)
+
+        mask_ema=None,
+        baseline_ema=None,
+        mask_open=0,
+        # mask_ema: 마스크의 시간 평균 가중치, 예: 0.5. 한 프레임짜리 노이즈를 줄임 (Weight of the newest mask in a float32 running average, e.g. 0.5; the alert logic sees the average, so one-frame flicker is damped and a real change still shows within a few frames.)
+        # baseline_ema: 정상 프레임에서 기준 마스크를 교체하지 않고 이 비율만큼 이동 (On normal frames the baseline moves towards the mask by this weight, e.g. 0.2, instead of being replaced by it; single ROI only, ValueError with regions.)
+        # mask_open: 작은 점과 구멍을 지우는 모폴로지 커널 크기(픽셀), 0은 사용 안 함 (Kernel size in mask pixels for an opening and closing that remove specks and pinholes; 0 disables.)
+
+        measure_full_frame=False,
+        # measure_full_frame: roi_only일 때 전체 프레임 추론을 한 번만 측정해 절약된 시간을 표시 (With roi_only, time one full-frame pass on the first frame this Monitor analyzes so latency_saved_ms can be shown; off by default because that frame takes twice as long.)
     ):
         self.sensitivity = sensitivity
         self.consecutive_threshold = consecutive_threshold
@@ -35,96 +69,381 @@ class Monitor:
         self.mint_bgr = mint_bgr
         self.alert_bgr = alert_bgr
         self.box_thickness = box_thickness
+        self._alert_half = np.array(alert_bgr, np.uint8) >> 1
+        self.roi_only = roi_only
+        self.roi_padding = roi_padding
+        self.motion_gate = motion_gate
+        self.infer_scale = infer_scale
+        self.measure_full_frame = measure_full_frame
+        self.mask_ema = mask_ema
+        self.baseline_ema = baseline_ema
+        self._kernel = cv2.getStructuringElement(
+            cv2.MORPH_ELLIPSE, (mask_open, mask_open)) if mask_open > 1 else None
+        self.inferences_run = 0
+        self.inferences_skipped = 0
+        # anything with record(stage, seconds); None disables stage timing
+        self.profiler = None
 
         # create a single Rembg session with the light U²-Net-P model
-        self.session = new_session(model_name)
+        if engine is None:
+            engine = create_mask_engine(backend, model_name,
+                                        precision=precision)
+        self.engine = engine
+        self.session = self.engine.session
 
+        self.regions = None
+        self.set_regions(regions)
         self.reset()
+        self.dp = 0
         self.db = 0
+        self.infer_ms = 0.0
+        self.full_frame_ms = None
+        self.latency_saved_ms = 0.0
 
     def reset(self):
+        # Mask, crop and display buffers are (re)allocated on the first frame
+        # after a reset, once the ROI and frame sizes are known, and then
+        # reused for every frame after that.
         self.baseline_mask = None
         self.prev_mask = None
+        self._masks = None
+        self._small = None
+        self._overlay_mask = None
+        self._tint = None
+        self._tinted = None
+        self._mroi = None
+        self._disp = None
+        self._smooth = None
+        self._baseline_f = None
+        self._baseline_u8 = None
         self.abnormal_count = 0
         self.alert = False
+        self.last_mask = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.regions is not None:
+            self.regions.reset()
 
-    def process_frame(self, frame, roi_canvas, sx, sy):
-        disp = frame.copy()
+    def set_regions(self, regions):
+        # Replaces the watched regions (a list of Region, or None for the
+        # single ROI); call reset() before the next frame
+        if regions and self.baseline_ema is not None:
+            raise ValueError("baseline_ema only works with a single ROI, "
+                             "not with regions")
+        self.regions = RegionSet(regions) if regions else None
+
+    def roi_rect(self, frame, roi_canvas, sx, sy):
         x_c, y_c, w_c, h_c = roi_canvas
         x = int(x_c * sx)
         y = int(y_c * sy)
         rw = int(w_c * sx)
         rh = int(h_c * sy)
 
-        # Apply rembg to the entire frame using our lightweight session
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil = Image.fromarray(rgb)
-        out = remove(pil, session=self.session)
-        outnp = np.array(out)
-        alpha = outnp[:, :, 3]
+        fh, fw = frame.shape[:2]
+        x, y = min(max(x, 0), fw), min(max(y, 0), fh)
+        rw, rh = min(rw, fw - x), min(rh, fh - y)
+        return x, y, rw, rh
+
+    def _update_state(self, mask, dp):
+        normal = (dp < self.sensitivity and self.db < self.sensitivity)
+        if normal:
+            self.abnormal_count = 0
+            self.baseline_mask = self._move_baseline(mask)
+            if self.alert:
+                self.alert = False
+            return False
+        self.abnormal_count += 1
+        if self.abnormal_count >= self.consecutive_threshold and not self.alert:
+            self.alert = True
+            return True
+        return False
+
+    def _move_baseline(self, mask):
+        # The baseline after a normal frame
+        if self.baseline_ema is None:
+            # the baseline aliases this frame's mask buffer instead of copying
+            return mask
+        if self.baseline_mask is None or self._baseline_f is None \
+                or self._baseline_f.shape != mask.shape:
+            self._baseline_f = mask.astype(np.float32)
+            self._baseline_u8 = mask.copy()
+        else:
+            cv2.accumulateWeighted(mask, self._baseline_f, self.baseline_ema)
+            cv2.convertScaleAbs(self._baseline_f, dst=self._baseline_u8)
+        return self._baseline_u8
+
+    def _filter_mask(self, mask):
+        # Optional cleanup and temporal smoothing, in place in the mask buffer
+        if self._kernel is not None:
+            # opening drops specks, closing fills pinholes
+            cv2.morphologyEx(mask, cv2.MORPH_OPEN, self._kernel, dst=mask)
+            cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self._kernel, dst=mask)
+        if self.mask_ema is None:
+            return
+        if self.baseline_mask is None or self._smooth is None \
+                or self._smooth.shape != mask.shape:
+            self._smooth = mask.astype(np.float32)
+        else:
+            cv2.accumulateWeighted(mask, self._smooth, self.mask_ema)
+            cv2.convertScaleAbs(self._smooth, dst=mask)
+
+    def skip_inference(self, frame, rect):
+        # Returns (alert_triggered, db) when the motion gate lets the previous
+        # mask stand for this frame, otherwise None.
+        x, y, rw, rh = rect
+        if (
+            self.motion_gate is None
+            or self.baseline_mask is None
+            or self.last_mask is None
+            or self.last_mask[0] != rect
+            or self.motion_gate.should_infer(frame[y: y + rh, x: x + rw])
+        ):
+            return None
+        # static scene: reuse the previous mask and db, but keep the
+        # consecutive-count state machine running on them
+        self.inferences_skipped += 1
+        if self.regions is not None:
+            triggered = self.regions.hold(
+                self.prev_mask, self.sensitivity, self.consecutive_threshold)
+            self._summarise_regions()
+            return triggered, self.db
+        return self._update_state(self.prev_mask, 0.0), self.db
+
+    def inference_crop(self, frame, rect, reuse_buffer=True):
+        # The image the model should see and the ROI window (x, y, w, h)
+        # inside the mask it will produce
+        x, y, rw, rh = rect
+        if self.roi_only:
+            # only the padded ROI goes through the model; the mask is ROI-sized
+            fh, fw = frame.shape[:2]
+            p = self.roi_padding
+            px0, py0 = max(x - p, 0), max(y - p, 0)
+            px1, py1 = min(x + rw + p, fw), min(y + rh + p, fh)
+            crop, ox, oy = frame[py0:py1, px0:px1], x - px0, y - py0
+        else:
+            crop, ox, oy = frame, x, y
+
+        s = self.infer_scale
+        if s == 1.0:
+            return crop, (ox, oy, rw, rh)
+        # downscale once; the mask stays at this size until it is drawn
+        ch, cw = crop.shape[:2]
+        sw, sh = max(int(cw * s), 1), max(int(ch * s), 1)
+        if not reuse_buffer:
+            small = cv2.resize(crop, (sw, sh), interpolation=cv2.INTER_AREA)
+        else:
+            if self._small is None or self._small.shape[:2] != (sh, sw):
+                self._small = np.empty((sh, sw) + crop.shape[2:], np.uint8)
+            small = cv2.resize(crop, (sw, sh), dst=self._small,
+                               interpolation=cv2.INTER_AREA)
+        ox, oy = min(int(ox * s), sw - 1), min(int(oy * s), sh - 1)
+        mw = min(max(int(round(rw * s)), 1), sw - ox)
+        mh = min(max(int(round(rh * s)), 1), sh - oy)
+        return small, (ox, oy, mw, mh)
+
+    def _free_mask(self, shape):
+        # Three mask buffers are enough: one for prev, one for baseline (when
+        # it differs from prev) and one to write the new mask into.
+        if self._masks is None or self._masks[0].shape != shape:
+            self._masks = [np.empty(shape, np.uint8) for _ in range(3)]
+            self.baseline_mask = None
+            self.prev_mask = None
+        for buf in self._masks:
+            if buf is not self.prev_mask and buf is not self.baseline_mask:
+                return buf
 
-        # Create mask for ROI
-        mask = np.zeros_like(alpha, dtype=np.uint8)
-        mask[y: y + rh, x: x + rw] = alpha[y: y + rh, x: x + rw]
+    def update(self, rect, alpha, window):
+        # Feed one segmentation result into the alert state machine
+        ox, oy, mw, mh = window
+        mask = self._free_mask((mh, mw))
+        np.copyto(mask, alpha[oy: oy + mh, ox: ox + mw])
+        self._filter_mask(mask)
+        self.inferences_run += 1
 
         if self.baseline_mask is None:
-            self.baseline_mask = mask.copy()
-            self.prev_mask = mask.copy()
+            self.baseline_mask = self._move_baseline(mask)
             self.abnormal_count = 0
             self.alert = False
             alert_triggered_this_frame = False
+            if self.regions is not None:
+                self.regions.start(rect, mask)
+        elif self.regions is not None:
+            # each region keeps its own baseline; this only marks the start
+            self.baseline_mask = mask
+            alert_triggered_this_frame = self.regions.update(
+                rect, mask, self.prev_mask, self.sensitivity,
+                self.consecutive_threshold)
+            self._summarise_regions()
         else:
-            total = rw * rh * 255.0
-            dp = cv2.absdiff(mask, self.prev_mask).sum() / total * 100
-            self.db = cv2.absdiff(mask, self.baseline_mask).sum() / total * 100
-            normal = (dp < self.sensitivity and self.db < self.sensitivity)
-            if normal:
-                self.abnormal_count = 0
-                self.baseline_mask = mask.copy()
-                if self.alert:
-                    self.alert = False
-                alert_triggered_this_frame = False
-            else:
-                self.abnormal_count += 1
-                if (
-                    self.abnormal_count >= self.consecutive_threshold
-                    and not self.alert
-                ):
-                    self.alert = True
-                    alert_triggered_this_frame = True
-                else:
-                    alert_triggered_this_frame = False
-            self.prev_mask = mask.copy()
-
-        # Create overlay
-        overlay = disp.copy()
-        reg = overlay[y: y + rh, x: x + rw]
-        green = np.zeros_like(reg)
-        green[:] = self.mint_bgr
-        mroi = (mask[y: y + rh, x: x + rw] > 0)
-        tinted = cv2.addWeighted(
-            reg, 1 - self.blend_alpha, green, self.blend_alpha, 0)
-        reg[mroi] = tinted[mroi]
-        overlay[y: y + rh, x: x + rw] = reg
-        disp = overlay
+            # L1 norm of the difference: the absdiff sum without a temporary
+            total = max(mask.size, 1) * 255.0
+            dp = cv2.norm(mask, self.prev_mask, cv2.NORM_L1) / total * 100
+            self.dp = dp
+            self.db = cv2.norm(
+                mask, self.baseline_mask, cv2.NORM_L1) / total * 100
+            alert_triggered_this_frame = self._update_state(mask, dp)
+        # the old prev buffer is recycled on the next frame
+        self.prev_mask = mask
+
+        # rect and mask are swapped in together so another thread can draw them
+        self.last_mask = (rect, mask)
+        return alert_triggered_this_frame, self.db
+
+    def _summarise_regions(self):
+        # Monitor-level dp, db and count follow the region nearest its
+        # sensitivity; the alert is on while any region's is
+        worst = self.regions.worst(self.sensitivity)
+        self.dp, self.db = worst.dp, worst.db
+        self.abnormal_count = worst.abnormal_count
+        self.alert = any(r.alert for r in self.regions.includes)
+
+    def locate(self, frame, roi_canvas, sx, sy):
+        # The ROI rect in frame pixels. With regions set, roi_canvas is
+        # ignored and the ROI is their bounding box.
+        if self.regions is not None:
+            roi_canvas = self.regions.bounds()
+            self.regions.locate([self.roi_rect(frame, r.rect, sx, sy)
+                                 for r in self.regions.regions])
+        return self.roi_rect(frame, roi_canvas, sx, sy)
+
+    def analyze(self, frame, roi_canvas, sx, sy):
+        rect = self.locate(frame, roi_canvas, sx, sy)
+        skipped = self.skip_inference(frame, rect)
+        if skipped is not None:
+            return skipped
+
+        crop, window = self.inference_crop(frame, rect)
+        h, w = crop.shape[:2]
+        t0 = time.perf_counter()
+        prepared = self.engine.prepare(crop)
+        t1 = time.perf_counter()
+        alpha = self.engine.predict(prepared, (w, h))
+        t2 = time.perf_counter()
+        infer_ms = (t2 - t0) * 1000
+        self.infer_ms = infer_ms if self.infer_ms == 0 else (
+            0.9 * self.infer_ms + 0.1 * infer_ms)
+
+        if (self.measure_full_frame and self.roi_only
+                and self.full_frame_ms is None):
+            # time one full-frame pass per Monitor so the saving can be shown
+            t = time.perf_counter()
+            self.engine.alpha(frame)
+            self.full_frame_ms = (time.perf_counter() - t) * 1000
+        if self.full_frame_ms is not None:
+            self.latency_saved_ms = self.full_frame_ms - self.infer_ms
+
+        t3 = time.perf_counter()
+        result = self.update(rect, alpha, window)
+        if self.profiler is not None:
+            self.profiler.record("preprocess", t1 - t0)
+            self.profiler.record("inference", t2 - t1)
+            self.profiler.record("mask_diff", time.perf_counter() - t3)
+        return result
+
+    def roi_mask(self, size=None):
+        # The latest mask at ROI resolution (or at size=(w, h)), resized if it
+        # was inferred at a different scale; returns (rect, mask) or None
+        last = self.last_mask
+        if last is None:
+            return None
+        (x, y, rw, rh), mask = last
+        if size is not None:
+            rw, rh = size
+        if mask.shape != (rh, rw):
+            if self._overlay_mask is None or self._overlay_mask.shape != (rh, rw):
+                self._overlay_mask = np.empty((rh, rw), np.uint8)
+            mask = cv2.resize(mask, (rw, rh), dst=self._overlay_mask,
+                              interpolation=cv2.INTER_LINEAR)
+        return (x, y, rw, rh), mask
+
+    def scaled_mask(self, fx=1.0, fy=1.0):
+        # The latest (rect, mask) with camera pixels mapped through fx, fy,
+        # e.g. to canvas coordinates; None before the first mask
+        last = self.last_mask
+        if last is None:
+            return None
+        x, y, rw, rh = last[0]
+        if fx != 1.0 or fy != 1.0:
+            x, y = int(x * fx), int(y * fy)
+            rw, rh = max(int(rw * fx), 1), max(int(rh * fy), 1)
+        return (x, y, rw, rh), self.roi_mask((rw, rh))[1]
+
+    def draw_overlay(self, frame, fx=1.0, fy=1.0):
+        # Draws onto a copy of frame, which may be a resized view of the
+        # camera frame: fx, fy map camera pixels to frame pixels. The returned
+        # image is a buffer owned by the Monitor and is overwritten by the
+        # next call.
+        t0 = time.perf_counter()
+        if self._disp is None or self._disp.shape != frame.shape:
+            self._disp = np.empty_like(frame)
+        disp = self._disp
+        np.copyto(disp, frame)
+        last = self.scaled_mask(fx, fy)
+        if last is None:
+            return disp
+        (x, y, rw, rh), mask = last
+
+        # Create overlay, blending the tint into the ROI in place
+        if self._tint is None or self._tint.shape[:2] != (rh, rw):
+            self._tint = np.empty((rh, rw, 3), np.uint8)
+            self._tint[:] = self.mint_bgr
+            self._tinted = np.empty((rh, rw, 3), np.uint8)
+            self._mroi = np.empty((rh, rw, 1), np.bool_)
+        reg = disp[y: y + rh, x: x + rw]
+        cv2.addWeighted(reg, 1 - self.blend_alpha, self._tint,
+                        self.blend_alpha, 0, dst=self._tinted)
+        np.greater(mask[:, :, None], 0, out=self._mroi)
+        np.copyto(reg, self._tinted, where=self._mroi)
 
         if self.alert:
-            red = np.zeros_like(disp)
-            red[:] = self.alert_bgr
-            disp = cv2.addWeighted(disp, 0.5, red, 0.5, 0)
-
-        box_col = self.alert_bgr if self.alert else self.mint_bgr
-        cv2.rectangle(disp, (x, y), (x + rw, y + rh),
-                      box_col, self.box_thickness)
-        seq_txt = f"{self.abnormal_count}/{self.consecutive_threshold}"
-        cv2.putText(
-            disp,
-            seq_txt,
-            (x + 5, y + 25),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.8,
-            box_col,
-            2,
-        )
-
-        return disp, alert_triggered_this_frame, self.db
+            # 50/50 blend with the alert colour: disp / 2 + alert / 2
+            np.right_shift(disp, 1, out=disp)
+            np.add(disp, self._alert_half, out=disp)
+
+        f = min(fx, fy)
+        if self.regions is not None and self.regions.frame_rects is not None:
+            self._draw_regions(disp, fx, fy)
+        else:
+            box_col = self.alert_bgr if self.alert else self.mint_bgr
+            cv2.rectangle(disp, (x, y), (x + rw, y + rh),
+                          box_col, max(int(round(self.box_thickness * f)), 1))
+            seq_txt = f"{self.abnormal_count}/{self.consecutive_threshold}"
+            cv2.putText(
+                disp,
+                seq_txt,
+                (x + 5, y + int(25 * f)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.8 * f,
+                box_col,
+                max(int(round(2 * f)), 1),
+            )
+
+        if self.profiler is not None:
+            self.profiler.record("overlay", time.perf_counter() - t0)
+        return disp
+
+    def _draw_regions(self, disp, fx, fy):
+        # one box per region with its own count; exclusion zones in grey
+        f = min(fx, fy)
+        thickness = max(int(round(self.box_thickness * f)), 1)
+        for r, (x, y, rw, rh) in zip(self.regions.regions,
+                                     self.regions.frame_rects):
+            x, y = int(x * fx), int(y * fy)
+            x1, y1 = x + int(rw * fx), y + int(rh * fy)
+            if r.exclude:
+                cv2.rectangle(disp, (x, y), (x1, y1), (128, 128, 128),
+                              thickness)
+                cv2.line(disp, (x, y), (x1, y1), (128, 128, 128), 1)
+                continue
+            col = self.alert_bgr if r.alert else self.mint_bgr
+            threshold = r.settings(self.sensitivity,
+                                   self.consecutive_threshold)[1]
+            cv2.rectangle(disp, (x, y), (x1, y1), col, thickness)
+            cv2.putText(disp, f"{r.name} {r.abnormal_count}/{threshold}",
+                        (x + 5, y + int(25 * f)), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.6 * f, col, max(int(round(2 * f)), 1))
+
+    def process_frame(self, frame, roi_canvas, sx, sy):
+        alert_triggered_this_frame, db = self.analyze(
+            frame, roi_canvas, sx, sy)
+        return self.draw_overlay(frame), alert_triggered_this_frame, db
@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    # Cheap pre-filter in front of the segmentation model. The ROI is
+    # downscaled to grey and compared with the ROI the model last saw; while
+    # the mean change stays under `threshold` the previous mask is reused, but
+    # never for more than `max_skip` frames in a row so slow drift is caught.
+
+    def __init__(self, threshold=2.0, max_skip=10, scale=0.25):
+        self.threshold = threshold  # mean absolute grey difference (0-255)
+        self.max_skip = max_skip
+        self.scale = scale
+        self.checked = 0
+        self.skipped = 0
+        self.last_change = 0.0
+        self._small = None
+        self._gray = None
+        self._ref = None
+        self._since_infer = 0
+
+    def reset(self):
+        self._ref = None
+        self._since_infer = 0
+        self.last_change = 0.0
+
+    def should_infer(self, roi_bgr):
+        h, w = roi_bgr.shape[:2]
+        sw = max(int(w * self.scale), 1)
+        sh = max(int(h * self.scale), 1)
+        if self._gray is None or self._gray.shape != (sh, sw):
+            self._small = np.empty((sh, sw, 3), np.uint8)
+            self._gray = np.empty((sh, sw), np.uint8)
+            self._ref = None
+
+        cv2.resize(roi_bgr, (sw, sh), dst=self._small,
+                   interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        self.checked += 1
+
+        if self._ref is None:
+            self._ref = self._gray.copy()
+            self._since_infer = 0
+            return True
+
+        self.last_change = cv2.norm(
+            self._gray, self._ref, cv2.NORM_L1) / self._gray.size
+        if self.last_change < self.threshold and self._since_infer < self.max_skip:
+            self._since_infer += 1
+            self.skipped += 1
+            return False
+
+        np.copyto(self._ref, self._gray)
+        self._since_infer = 0
+        return True
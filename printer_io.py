@@ -0,0 +1,176 @@
+import abc
+import time
+
+# --- GPIO and Filament Sensor Setup ---
+FILAMENT_SENSOR_PIN = 22
+PRINTER_PAUSE_PIN = 17
+
+# --- Pin drivers for event-driven I/O ---
+# read/write take and return logic levels (True is HIGH); watch() calls
+# callback() from the driver's own thread on every edge of an input pin.
+
+class PinDriver(abc.ABC):
+    name = "base"
+    simulated = False
+
+    def setup_input(self, pin):
+        pass
+
+    def setup_output(self, pin):
+        pass
+
+    @abc.abstractmethod
+    def read(self, pin):
+        pass
+
+    @abc.abstractmethod
+    def write(self, pin, level):
+        pass
+
+    @abc.abstractmethod
+    def watch(self, pin, callback):
+        pass
+
+    def unwatch(self, pin):
+        pass
+
+    def cleanup(self):
+        pass
+
+    def set_printer_state(self, run_printer, pin=PRINTER_PAUSE_PIN):
+        # pause pin LOW runs the printer, HIGH pauses it
+        self.write(pin, not run_printer)
+        prefix = "SIMULATE: " if self.simulated else ""
+        if run_printer:
+            print(f"{prefix}GPIO {pin} set to LOW (0 V) - Printer Running")
+        else:
+            print(f"{prefix}GPIO {pin} set to HIGH - Printer Paused")
+
+
+class RPiGPIODriver(PinDriver):
+    # RPi.GPIO edge detection; callbacks run on its event thread
+    name = "rpi"
+
+    def __init__(self):
+        import RPi.GPIO as gpio
+        self.gpio = gpio
+        gpio.setmode(gpio.BCM)
+
+    def setup_input(self, pin):
+        self.gpio.setup(pin, self.gpio.IN, pull_up_down=self.gpio.PUD_DOWN)
+
+    def setup_output(self, pin):
+        self.gpio.setup(pin, self.gpio.OUT)
+
+    def read(self, pin):
+        return self.gpio.input(pin) == self.gpio.HIGH
+
+    def write(self, pin, level):
+        self.gpio.output(pin, self.gpio.HIGH if level else self.gpio.LOW)
+
+    def watch(self, pin, callback):
+        self.gpio.add_event_detect(pin, self.gpio.BOTH,
+                                   callback=lambda channel: callback())
+
+    def unwatch(self, pin):
+        self.gpio.remove_event_detect(pin)
+
+    def cleanup(self):
+        self.gpio.cleanup()
+
+
+class GpiozeroDriver(PinDriver):
+    # gpiozero devices, e.g. on a Pi 5 where RPi.GPIO does not work
+    name = "gpiozero"
+
+    def __init__(self):
+        import gpiozero
+        # fails here rather than on the first pin when no backend works
+        gpiozero.Device.ensure_pin_factory()
+        self.gpiozero = gpiozero
+        self._inputs = {}
+        self._outputs = {}
+
+    def setup_input(self, pin):
+        if pin not in self._inputs:
+            self._inputs[pin] = self.gpiozero.DigitalInputDevice(
+                pin, pull_up=False)
+
+    def setup_output(self, pin):
+        if pin not in self._outputs:
+            self._outputs[pin] = self.gpiozero.DigitalOutputDevice(pin)
+
+    def read(self, pin):
+        return bool(self._inputs[pin].value)
+
+    def write(self, pin, level):
+        self._outputs[pin].value = bool(level)
+
+    def watch(self, pin, callback):
+        device = self._inputs[pin]
+        device.when_activated = lambda: callback()
+        device.when_deactivated = lambda: callback()
+
+    def unwatch(self, pin):
+        device = self._inputs[pin]
+        device.when_activated = None
+        device.when_deactivated = None
+
+    def cleanup(self):
+        for device in list(self._inputs.values()) + \
+                list(self._outputs.values()):
+            device.close()
+        self._inputs.clear()
+        self._outputs.clear()
+
+
+class SimulatedDriver(PinDriver):
+    # In-memory pins. set_input() changes an input level and fires its
+    # callbacks on the caller's thread, like an interrupt; every write is
+    # kept in `writes` as (pin, level, time.perf_counter()).
+    name = "simulated"
+    simulated = True
+
+    def __init__(self, levels=None):
+        self.levels = dict(levels or {})
+        self.writes = []
+        self._callbacks = {}
+
+    def read(self, pin):
+        return self.levels.get(pin, False)
+
+    def write(self, pin, level):
+        self.levels[pin] = bool(level)
+        self.writes.append((pin, bool(level), time.perf_counter()))
+
+    def watch(self, pin, callback):
+        self._callbacks[pin] = callback
+
+    def unwatch(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def set_input(self, pin, level):
+        if self.levels.get(pin, False) == bool(level):
+            return
+        self.levels[pin] = bool(level)
+        callback = self._callbacks.get(pin)
+        if callback is not None:
+            callback()
+
+
+def create_driver(kind="auto"):
+    # "rpi", "gpiozero", "simulated" or "auto" (the first that imports)
+    if kind == "simulated":
+        return SimulatedDriver()
+    for name, cls in (("rpi", RPiGPIODriver), ("gpiozero", GpiozeroDriver)):
+        if kind not in ("auto", name):
+            continue
+        try:
+            return cls()
+        except Exception as e:
+            if kind == name:
+                raise
+            print(f"GPIO driver '{name}' not available: {e}")
+    if kind != "auto":
+        raise ValueError(f"Unknown GPIO driver '{kind}'")
+    return SimulatedDriver()
@@ -0,0 +1,145 @@
+import argparse
+import os
+import tempfile
+
+from frame_source import load_frames, parse_roi
+from mask_engine import (MODEL_DIR, MODEL_DIR_ENV, MODEL_SPECS, PRECISIONS,
+                         OnnxMaskEngine, load_session, variant_path)
+
+
+def original_model_path(model_name):
+    # the fp32 file rembg downloads (and verifies) on first use
+    from rembg.sessions import sessions_class
+    for cls in sessions_class:
+        if cls.name() == model_name:
+            return str(cls.download_models())
+    raise ValueError(f"Unknown rembg model '{model_name}'")
+
+
+class FrameCalibrationReader:
+    # Feeds recorded ROI crops through the same preprocessing the onnx
+    # backend uses at run time, so calibrated ranges match real inputs.
+
+    def __init__(self, engine, crops):
+        self.input_name = engine.input_name
+        self._tensors = [engine.prepare(crop).copy() for crop in crops]
+        self._index = 0
+
+    def get_next(self):
+        if self._index >= len(self._tensors):
+            return None
+        tensor = self._tensors[self._index]
+        self._index += 1
+        return {self.input_name: tensor}
+
+    def rewind(self):
+        self._index = 0
+
+
+def calibration_crops(source, roi, limit):
+    frames = load_frames(source, limit)
+    if not frames:
+        raise SystemExit(f"No calibration frames read from {source}")
+    fh, fw = frames[0].shape[:2]
+    x, y, w, h = roi or (fw // 4, fh // 4, fw // 2, fh // 2)
+    return [frame[y: y + h, x: x + w] for frame in frames]
+
+
+def to_fp16(src, dst):
+    import onnx
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+    # inputs and outputs stay float32 so the engine's buffers are unchanged
+    model = convert_float_to_float16(onnx.load(src), keep_io_types=True)
+    onnx.save(model, dst)
+
+
+def to_int8_dynamic(src, dst):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+
+
+def to_int8_static(src, dst, reader, per_channel):
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat,
+                                          QuantType, quantize_static)
+    quantize_static(src, dst, reader, quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8, per_channel=per_channel,
+                    calibrate_method=CalibrationMethod.MinMax)
+
+
+def preprocess(src, dst):
+    # shape inference and graph cleanup recommended before quantisation
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    try:
+        quant_pre_process(src, dst, skip_symbolic_shape=True)
+        return dst
+    except Exception as e:
+        print(f"  pre-processing skipped: {e}")
+        return src
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write fp16 and int8 variants of the rembg models for "
+                    "Monitor(precision=...). int8-static calibrates "
+                    "activation ranges on recorded frames.")
+    parser.add_argument("--models", default="u2netp,u2net",
+                        help="comma-separated rembg model names")
+    parser.add_argument("--precisions", default="fp16,int8,int8-static",
+                        help="comma-separated, from "
+                             + ", ".join(p for p in PRECISIONS if p != "fp32"))
+    parser.add_argument("--calibration",
+                        help="video file or image directory; required for "
+                             "int8-static")
+    parser.add_argument("--roi", type=parse_roi,
+                        help="x,y,w,h in frame pixels (default: centre half)")
+    parser.add_argument("--frames", type=int, default=64,
+                        help="calibration frames to use")
+    parser.add_argument("--per-channel", action="store_true",
+                        help="per-channel weight scales for int8-static")
+    parser.add_argument("--out-dir", default=MODEL_DIR,
+                        help=f"where to write the variants (default: "
+                             f"%(default)s, where the onnx backend looks; "
+                             f"set {MODEL_DIR_ENV} to use another directory "
+                             f"at run time)")
+    args = parser.parse_args()
+
+    precisions = [p.strip() for p in args.precisions.split(",")]
+    for p in precisions:
+        if p not in PRECISIONS or p == "fp32":
+            raise SystemExit(f"Unknown precision '{p}'")
+    crops = None
+    if "int8-static" in precisions:
+        if not args.calibration:
+            raise SystemExit("int8-static needs --calibration frames")
+        crops = calibration_crops(args.calibration, args.roi, args.frames)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for model in args.models.split(","):
+        model = model.strip()
+        if model not in MODEL_SPECS:
+            print(f"[{model}] not supported by the onnx backend, skipped")
+            continue
+        src = original_model_path(model)
+        print(f"[{model}] {src} ({os.path.getsize(src) / 1e6:.1f} MB)")
+        with tempfile.TemporaryDirectory() as tmp:
+            pre = None
+            for precision in precisions:
+                dst = variant_path(model, precision, args.out_dir)
+                if precision == "fp16":
+                    to_fp16(src, dst)
+                else:
+                    if pre is None:
+                        pre = preprocess(src, os.path.join(tmp, "pre.onnx"))
+                    if precision == "int8":
+                        to_int8_dynamic(pre, dst)
+                    else:
+                        engine = OnnxMaskEngine(
+                            model, session=load_session(model, cache_dir=None))
+                        reader = FrameCalibrationReader(engine, crops)
+                        to_int8_static(pre, dst, reader, args.per_channel)
+                print(f"  {precision:<12}{dst} "
+                      f"({os.path.getsize(dst) / 1e6:.1f} MB)")
+    if os.path.abspath(args.out_dir) != os.path.abspath(MODEL_DIR):
+        print(f"Set {MODEL_DIR_ENV}={args.out_dir} so the onnx backend "
+              f"loads these variants.")
@@ -0,0 +1,185 @@
+import cv2
+import numpy as np
+
+
+class Region:
+    # A named rectangle inside the monitored area with its own sensitivity
+    # and consecutive-count state; None falls back to the Monitor's
+    # setting. exclude=True makes it an exclusion zone (e.g. where the
+    # toolhead moves): its pixels are left out of every region's diff.
+    # rect is in the same coordinates as the roi passed to Monitor.analyze.
+
+    def __init__(self, name, rect, sensitivity=None,
+                 consecutive_threshold=None, exclude=False):
+        self.name = name
+        self.rect = tuple(int(v) for v in rect)
+        self.sensitivity = sensitivity
+        self.consecutive_threshold = consecutive_threshold
+        self.exclude = exclude
+        self.reset()
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(**cfg)
+
+    def settings(self, sensitivity, consecutive_threshold):
+        # this region's (sensitivity, consecutive_threshold)
+        return (sensitivity if self.sensitivity is None else self.sensitivity,
+                consecutive_threshold if self.consecutive_threshold is None
+                else self.consecutive_threshold)
+
+    def reset(self):
+        self.abnormal_count = 0
+        self.alert = False
+        self.dp = 0.0
+        self.db = 0.0
+        # the region's slice of the last normal mask, only kept while the
+        # region is abnormal; otherwise the baseline is the previous mask
+        self.baseline = None
+
+
+def bounds(rects):
+    # union bounding box (x, y, w, h) of (x, y, w, h) rects
+    x0 = min(r[0] for r in rects)
+    y0 = min(r[1] for r in rects)
+    x1 = max(r[0] + r[2] for r in rects)
+    y1 = max(r[1] + r[3] for r in rects)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class RegionSet:
+    # Runs Monitor's alert state machine per region over one mask of the
+    # union bounding box. Each frame the mask difference is taken once,
+    # exclusion zones are cleared from it and it is summed into an integral
+    # image, so a region's change is four lookups whatever its size.
+    # Regions only compare against a held baseline while abnormal, and
+    # then only over their own slice.
+
+    def __init__(self, regions):
+        self.regions = list(regions)
+        self.includes = [r for r in self.regions if not r.exclude]
+        self.excludes = [r for r in self.regions if r.exclude]
+        if not self.includes:
+            raise ValueError("At least one include region is needed")
+        self.triggered = []  # names of the regions that alerted last frame
+        self.frame_rects = None  # region rects in camera pixels
+        self._key = None
+
+    def bounds(self):
+        return bounds([r.rect for r in self.includes])
+
+    def reset(self):
+        for r in self.regions:
+            r.reset()
+        self.triggered = []
+
+    def locate(self, frame_rects):
+        # region rects in camera pixels, in self.regions order
+        self.frame_rects = list(frame_rects)
+
+    def _layout(self, rect, shape):
+        # Region windows in mask coordinates and the exclusion mask; rebuilt
+        # only when the ROI, the regions or the mask size change
+        key = (rect, shape, tuple(self.frame_rects))
+        if key == self._key:
+            return
+        x, y, rw, rh = rect
+        mh, mw = shape
+        fx, fy = mw / max(rw, 1), mh / max(rh, 1)
+
+        def window(r):
+            a, b, c, d = r
+            x0 = min(max(int(np.floor((a - x) * fx)), 0), mw)
+            y0 = min(max(int(np.floor((b - y) * fy)), 0), mh)
+            x1 = min(max(int(np.ceil((a + c - x) * fx)), x0), mw)
+            y1 = min(max(int(np.ceil((b + d - y) * fy)), y0), mh)
+            return x0, y0, x1, y1
+
+        windows = {id(r): window(fr)
+                   for r, fr in zip(self.regions, self.frame_rects)}
+        self._windows = [windows[id(r)] for r in self.includes]
+        self._keep = None
+        if self.excludes:
+            self._keep = np.full(shape, 255, np.uint8)
+            for r in self.excludes:
+                x0, y0, x1, y1 = windows[id(r)]
+                self._keep[y0:y1, x0:x1] = 0
+        w = np.array(self._windows).T
+        self._x0, self._y0, self._x1, self._y1 = w
+        # int32 sums overflow past ~8.4 Mpx of full-scale change
+        self._sdepth = cv2.CV_32S if mh * mw < (1 << 23) else cv2.CV_64F
+        self._diff = np.empty(shape, np.uint8)
+        self._sum = None
+        if self._keep is None:
+            counts = (self._x1 - self._x0) * (self._y1 - self._y0)
+        else:
+            counts = self._sums(cv2.integral(self._keep // 255))
+        self._total = np.maximum(counts, 1) * 255.0
+        for r in self.includes:
+            r.baseline = None
+        self._key = key
+
+    def _sums(self, integral):
+        return (integral[self._y1, self._x1] - integral[self._y0, self._x1]
+                - integral[self._y1, self._x0] + integral[self._y0, self._x0])
+
+    def _keep_slice(self, i):
+        if self._keep is None:
+            return None
+        x0, y0, x1, y1 = self._windows[i]
+        return self._keep[y0:y1, x0:x1]
+
+    def start(self, rect, mask):
+        # first mask after a reset: it becomes every region's baseline
+        self._layout(rect, mask.shape)
+        self.reset()
+
+    def update(self, rect, mask, prev, sensitivity, consecutive_threshold):
+        # Per-region dp and db for one new mask; returns True if any region
+        # raised its alert on this frame
+        self._layout(rect, mask.shape)
+        cv2.absdiff(mask, prev, dst=self._diff)
+        if self._keep is not None:
+            cv2.bitwise_and(self._diff, self._keep, dst=self._diff)
+        self._sum = cv2.integral(self._diff, self._sum, sdepth=self._sdepth)
+        dps = self._sums(self._sum) / self._total * 100
+        dbs = dps.copy()
+        for i, r in enumerate(self.includes):
+            if r.baseline is not None:
+                x0, y0, x1, y1 = self._windows[i]
+                dbs[i] = cv2.norm(mask[y0:y1, x0:x1], r.baseline,
+                                  cv2.NORM_L1, mask=self._keep_slice(i)) \
+                    / self._total[i] * 100
+        return self._step(dps, dbs, prev, sensitivity, consecutive_threshold)
+
+    def hold(self, prev, sensitivity, consecutive_threshold):
+        # motion-gated frame: the previous mask stands, dp is 0 and db keeps
+        # its last value, as in Monitor.skip_inference
+        dps = np.zeros(len(self.includes))
+        dbs = np.array([r.db for r in self.includes])
+        return self._step(dps, dbs, prev, sensitivity, consecutive_threshold)
+
+    def _step(self, dps, dbs, prev, sensitivity, consecutive_threshold):
+        self.triggered = []
+        for i, r in enumerate(self.includes):
+            sens, threshold = r.settings(sensitivity, consecutive_threshold)
+            r.dp, r.db = float(dps[i]), float(dbs[i])
+            if r.dp < sens and r.db < sens:
+                r.abnormal_count = 0
+                r.baseline = None
+                r.alert = False
+                continue
+            if r.baseline is None:
+                # the previous mask was the last normal one; hold its slice
+                x0, y0, x1, y1 = self._windows[i]
+                r.baseline = prev[y0:y1, x0:x1].copy()
+            r.abnormal_count += 1
+            if r.abnormal_count >= threshold and not r.alert:
+                r.alert = True
+                self.triggered.append(r.name)
+        return bool(self.triggered)
+
+    def worst(self, sensitivity):
+        # the include region closest to (or furthest past) its sensitivity
+        return max(self.includes, key=lambda r: r.db / max(
+            r.settings(sensitivity, None)[0], 1e-6))
@@ -0,0 +1,342 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from frame_source import iter_frames, parse_roi, source_fps
+from mask_engine import SESSION_CACHE_DIR, create_mask_engine
+from monitor import Monitor
+
+BLEND_ALPHA = 0.4
+MINT_BGR = (201, 252, 157)
+ALERT_BGR = (0, 0, 255)
+BOX_THICKNESS = 4
+
+MASK_CACHE_DIR = os.path.join(SESSION_CACHE_DIR, "masks")
+
+
+def cache_key(source, roi, settings):
+    st = os.stat(source)
+    text = json.dumps([os.path.abspath(source), st.st_mtime, st.st_size,
+                       roi, settings], sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def extract_masks(source, roi, settings, path):
+    # Runs the model once over the recording and streams the ROI masks, as
+    # Monitor would see them, into a raw uint8 file next to a JSON header
+    engine = create_mask_engine(settings["backend"], settings["model"],
+                                precision=settings["precision"])
+    monitor = Monitor(0, 1, BLEND_ALPHA, MINT_BGR, ALERT_BGR, BOX_THICKNESS,
+                      roi_only=settings["roi_only"],
+                      roi_padding=settings["roi_padding"], engine=engine,
+                      infer_scale=settings["infer_scale"])
+    count, shape = 0, None
+    start = time.perf_counter()
+    with open(path + ".part", "wb") as f:
+        for frame in iter_frames(source, settings["frames"]):
+            if roi is None:
+                fh, fw = frame.shape[:2]
+                roi = (fw // 4, fh // 4, fw // 2, fh // 2)
+            rect = monitor.roi_rect(frame, roi, 1, 1)
+            crop, (ox, oy, mw, mh) = monitor.inference_crop(frame, rect)
+            alpha = engine.alpha(crop)
+            mask = np.ascontiguousarray(alpha[oy: oy + mh, ox: ox + mw])
+            if shape is None:
+                shape = mask.shape
+            f.write(mask.tobytes())
+            count += 1
+            if count % 500 == 0:
+                print(f"  {count} frames, "
+                      f"{count / (time.perf_counter() - start):.1f} fps")
+    if count == 0:
+        os.remove(path + ".part")
+        raise ValueError(f"No frames could be read from '{source}'")
+    os.replace(path + ".part", path)
+    meta = {"source": source, "roi": list(roi), "count": count,
+            "shape": list(shape), "fps": source_fps(source),
+            "settings": settings}
+    with open(path + ".json", "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_masks(path):
+    # (N, h, w) memmap of cached masks and their JSON header
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    h, w = meta["shape"]
+    masks = np.memmap(path, np.uint8, "r", shape=(meta["count"], h, w))
+    return masks, meta
+
+
+def frame_diffs(masks, chunk=256):
+    # dp for every frame against the one before, in chunks so the int16
+    # temporaries stay small; frame 0 has no predecessor and gets 0
+    n = len(masks)
+    total = masks[0].size * 255.0
+    dp = np.zeros(n, np.float64)
+    for lo in range(1, n, chunk):
+        hi = min(lo + chunk, n)
+        cur = masks[lo:hi].astype(np.int16)
+        prev = masks[lo - 1: hi - 1].astype(np.int16)
+        dp[lo:hi] = np.abs(cur - prev).sum(axis=(1, 2)) / total * 100
+    return dp
+
+
+def replay_counts(masks, dp, sensitivity):
+    # Monitor._update_state over cached masks for one sensitivity. Returns
+    # the abnormal_count after each frame and db. The baseline only moves
+    # on normal frames, so while the scene is quiet it is the previous
+    # frame and db equals dp; the mask diff is only computed otherwise.
+    n = len(masks)
+    total = masks[0].size * 255.0
+    counts = np.zeros(n, np.int32)
+    db = np.zeros(n, np.float64)
+    baseline = 0
+    count = 0
+    for t in range(1, n):
+        if baseline == t - 1:
+            d = dp[t]
+        else:
+            d = cv2.norm(masks[t], masks[baseline], cv2.NORM_L1) / total * 100
+        db[t] = d
+        if dp[t] < sensitivity and d < sensitivity:
+            count = 0
+            baseline = t
+        else:
+            count += 1
+        counts[t] = count
+    return counts, db
+
+
+class _CachedModel:
+    # stands in for the mask engine when the masks come from the cache
+    session = None
+
+
+def monitor_counts(masks, sensitivity, filters):
+    # abnormal_count after every frame from Monitor.update itself, for the
+    # mask filters (mask_ema, baseline_ema, mask_open) replay_counts does
+    # not model. The threshold is out of reach so the alert never latches;
+    # the count does not depend on it.
+    monitor = Monitor(sensitivity, np.iinfo(np.int32).max, BLEND_ALPHA,
+                      MINT_BGR, ALERT_BGR, BOX_THICKNESS,
+                      engine=_CachedModel(), **filters)
+    h, w = masks.shape[1:]
+    window = (0, 0, w, h)
+    counts = np.zeros(len(masks), np.int32)
+    for t in range(len(masks)):
+        monitor.update(window, masks[t], window)
+        counts[t] = monitor.abnormal_count
+    return counts
+
+
+def alert_frames(counts, thresholds):
+    # An alert fires on the frame where the run of abnormal frames reaches
+    # the threshold (the count only resets on a normal frame, which also
+    # clears the alert), so every threshold falls out of one counts array
+    return {t: np.flatnonzero(counts == t) for t in thresholds}
+
+
+_worker_masks = None
+_worker_dp = None
+_worker_filters = None
+
+
+def _init_worker(path, dp, filters, stride):
+    global _worker_masks, _worker_dp, _worker_filters
+    _worker_masks = load_masks(path)[0][::stride]
+    _worker_dp = dp
+    _worker_filters = filters
+
+
+def _sweep_one(args):
+    sensitivity, thresholds = args
+    if _worker_filters:
+        counts = monitor_counts(_worker_masks, sensitivity, _worker_filters)
+    else:
+        counts, _ = replay_counts(_worker_masks, _worker_dp, sensitivity)
+    return sensitivity, alert_frames(counts, thresholds)
+
+
+def sweep(path, sensitivities, thresholds, workers=None, filters=None,
+          stride=1):
+    # {(sensitivity, threshold): indices of alert frames}; filters are
+    # Monitor keyword arguments such as {"mask_ema": 0.5}, and stride > 1
+    # replays every stride-th frame as if the model ran that much less often
+    masks = load_masks(path)[0][::stride]
+    dp = None if filters else frame_diffs(masks)
+    jobs = [(s, thresholds) for s in sensitivities]
+    results = {}
+    if workers == 1:
+        _init_worker(path, dp, filters, stride)
+        done = map(_sweep_one, jobs)
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(path, dp, filters, stride))
+        done = pool.map(_sweep_one, jobs)
+    for sensitivity, alerts in done:
+        for t, frames in alerts.items():
+            results[(sensitivity, t)] = frames
+    if workers != 1:
+        pool.shutdown()
+    return results
+
+
+def parse_values(text, kind):
+    # "10,20,30" or "start:stop:step" (stop included)
+    if ":" in text:
+        start, stop, step = (kind(v) for v in text.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+        return [kind(v) for v in values]
+    return [kind(v) for v in text.split(",")]
+
+
+def clock(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def score(frames, period, failure_at=None):
+    # (false alerts, seconds from the failure to the first alert after it
+    # or None); without a failure time every alert counts as false
+    times = frames * period
+    if failure_at is None:
+        return len(times), None
+    caught = times[times >= failure_at]
+    return (int(np.count_nonzero(times < failure_at)),
+            float(caught[0] - failure_at) if len(caught) else None)
+
+
+def compare_table(before, after, sensitivities, thresholds, period,
+                  failure_at):
+    print("\nFalse alerts without -> with the mask filters"
+          + (" (detection delay in s)" if failure_at is not None else "")
+          + ":")
+    print("  sens " + "".join(f"{t:>16}" for t in thresholds))
+    for s in sensitivities:
+        cells = []
+        for t in thresholds:
+            fb, db = score(before[(s, t)], period, failure_at)
+            fa, da = score(after[(s, t)], period, failure_at)
+            cell = f"{fb}->{fa}"
+            if failure_at is not None:
+                cell += " " + "/".join("-" if d is None else f"{d:.0f}"
+                                       for d in (db, da))
+            cells.append(f"{cell:>16}")
+        print(f"  {s:4g} " + "".join(cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay a recorded print through Monitor's alert logic "
+                    "for a grid of sensitivity and consecutive_threshold "
+                    "values. Masks are computed once and cached. Any of "
+                    "--mask-ema, --baseline-ema or --mask-open replays the "
+                    "grid again with those Monitor filters and compares "
+                    "false alerts.")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--roi", type=parse_roi,
+                        help="x,y,w,h in frame pixels (default: centre half)")
+    parser.add_argument("--sensitivities", default="5:60:5",
+                        help="list (10,20,30) or range start:stop:step")
+    parser.add_argument("--thresholds", default="1:10:1")
+    parser.add_argument("--fps", type=float,
+                        help="frame rate of the recording, for alert times "
+                             "(default: from the video, else 1)")
+    parser.add_argument("--model", default="u2netp")
+    parser.add_argument("--backend", default="onnx")
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--full-frame", action="store_true")
+    parser.add_argument("--roi-padding", type=int, default=16)
+    parser.add_argument("--frames", type=int)
+    parser.add_argument("--workers", type=int,
+                        help="processes for the sweep (default: all cores)")
+    parser.add_argument("--cache-dir", default=MASK_CACHE_DIR)
+    parser.add_argument("--json", help="write every alert time to this file")
+    parser.add_argument("--mask-ema", type=float,
+                        help="compare against Monitor(mask_ema=...)")
+    parser.add_argument("--baseline-ema", type=float,
+                        help="compare against Monitor(baseline_ema=...)")
+    parser.add_argument("--mask-open", type=int, default=0,
+                        help="compare against Monitor(mask_open=...)")
+    parser.add_argument("--every", type=int, default=1,
+                        help="replay every Nth frame, as with a lower "
+                             "detection rate")
+    parser.add_argument("--failure-at", type=float,
+                        help="seconds into the recording where the print "
+                             "fails; earlier alerts count as false (default: "
+                             "a good print, every alert is false)")
+    args = parser.parse_args()
+    filters = {k: v for k, v in (("mask_ema", args.mask_ema),
+                                 ("baseline_ema", args.baseline_ema),
+                                 ("mask_open", args.mask_open)) if v}
+
+    settings = {"model": args.model, "backend": args.backend,
+                "precision": args.precision, "infer_scale": args.scale,
+                "roi_only": not args.full_frame,
+                "roi_padding": args.roi_padding, "frames": args.frames}
+    os.makedirs(args.cache_dir, exist_ok=True)
+    path = os.path.join(args.cache_dir,
+                        cache_key(args.source, args.roi, settings) + ".masks")
+    if os.path.exists(path + ".json"):
+        print(f"Using cached masks {path}")
+    else:
+        print(f"Extracting masks from {args.source} into {path}")
+        try:
+            extract_masks(args.source, args.roi, settings, path)
+        except ValueError as e:
+            parser.error(str(e))
+
+    masks, meta = load_masks(path)
+    fps = args.fps or meta["fps"] or 1.0
+    sensitivities = parse_values(args.sensitivities, float)
+    thresholds = parse_values(args.thresholds, int)
+    period = args.every / fps  # seconds between replayed frames
+    start = time.perf_counter()
+    results = sweep(path, sensitivities, thresholds, args.workers,
+                    stride=args.every)
+    elapsed = time.perf_counter() - start
+    print(f"{meta['count']} frames ({clock(meta['count'] / fps)} at "
+          f"{fps:g} fps, every {args.every}), {len(results)} combinations "
+          f"in {elapsed:.2f} s")
+
+    print("\nAlerts (first alert time) per sensitivity x threshold:")
+    print("  sens " + "".join(f"{t:>14}" for t in thresholds))
+    for s in sensitivities:
+        cells = []
+        for t in thresholds:
+            frames = results[(s, t)]
+            first = clock(frames[0] * period) if len(frames) else "-"
+            cells.append(f"{len(frames):>4} {first:>9}")
+        print(f"  {s:4g} " + "".join(cells))
+
+    filtered = None
+    if filters:
+        start = time.perf_counter()
+        filtered = sweep(path, sensitivities, thresholds, args.workers,
+                         filters, args.every)
+        print(f"\nWith {filters}: {time.perf_counter() - start:.2f} s")
+        compare_table(results, filtered, sensitivities, thresholds, period,
+                      args.failure_at)
+
+    if args.json:
+        def entries(results):
+            return [{"sensitivity": s, "consecutive_threshold": t,
+                     "alert_times_s": (frames * period).tolist()}
+                    for (s, t), frames in sorted(results.items())]
+        report = {"source": args.source, "fps": fps, "frames": meta["count"],
+                  "every": args.every, "roi": meta["roi"],
+                  "settings": settings, "results": entries(results)}
+        if filtered is not None:
+            report["filters"] = filters
+            report["filtered_results"] = entries(filtered)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
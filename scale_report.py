@@ -0,0 +1,103 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from frame_source import load_frames, parse_roi
+from mask_engine import create_mask_engine
+from monitor import Monitor
+
+BLEND_ALPHA = 0.4
+MINT_BGR = (201, 252, 157)
+ALERT_BGR = (0, 0, 255)
+BOX_THICKNESS = 4
+
+
+def replay(frames, roi, engine, scale, sensitivity, consecutive_threshold,
+           roi_only):
+    # Per-frame ROI masks (at ROI resolution), db values and alert frames
+    monitor = Monitor(sensitivity, consecutive_threshold, BLEND_ALPHA,
+                      MINT_BGR, ALERT_BGR, BOX_THICKNESS, roi_only=roi_only,
+                      engine=engine, infer_scale=scale)
+    masks, dbs, alerts = [], [], []
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        alert_triggered, db = monitor.analyze(frame, roi, 1, 1)
+        masks.append(monitor.roi_mask()[1] > 127)
+        dbs.append(db)
+        if alert_triggered:
+            alerts.append(i)
+    elapsed = time.perf_counter() - start
+    return masks, np.array(dbs), alerts, elapsed / len(frames) * 1000
+
+
+def iou(a, b):
+    union = np.count_nonzero(a | b)
+    return 1.0 if union == 0 else np.count_nonzero(a & b) / union
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare masks, db and alerts at reduced inference "
+                    "scales against full resolution on a recorded print.")
+    parser.add_argument("source", help="video file or directory of images")
+    parser.add_argument("--roi", type=parse_roi,
+                        help="x,y,w,h in frame pixels (default: centre half)")
+    parser.add_argument("--scales", default="0.75,0.5,0.35,0.25")
+    parser.add_argument("--model", default="u2netp")
+    parser.add_argument("--backend", default="onnx")
+    parser.add_argument("--full-frame", action="store_true")
+    parser.add_argument("--frames", type=int)
+    parser.add_argument("--sensitivity", type=float, default=30)
+    parser.add_argument("--consecutive-threshold", type=int, default=3)
+    parser.add_argument("--min-iou", type=float, default=0.9,
+                        help="mean IoU a scale needs to be recommended")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames)
+    if not frames:
+        raise SystemExit(f"No frames read from {args.source}")
+    fh, fw = frames[0].shape[:2]
+    roi = args.roi or (fw // 4, fh // 4, fw // 2, fh // 2)
+    engine = create_mask_engine(args.backend, args.model)
+    run = dict(engine=engine, sensitivity=args.sensitivity,
+               consecutive_threshold=args.consecutive_threshold,
+               roi_only=not args.full_frame)
+
+    ref_masks, ref_db, ref_alerts, ref_ms = replay(frames, roi, scale=1.0,
+                                                   **run)
+    print(f"{len(frames)} frames, ROI {roi}, model {args.model}")
+    print(f"scale 1.00: {ref_ms:7.2f} ms/frame, alerts at {ref_alerts}")
+
+    report = {"model": args.model, "frames": len(frames), "roi": list(roi),
+              "reference": {"ms_per_frame": ref_ms, "alerts": ref_alerts},
+              "scales": []}
+    recommended = 1.0
+    for scale in sorted((float(s) for s in args.scales.split(",")),
+                        reverse=True):
+        masks, db, alerts, ms = replay(frames, roi, scale=scale, **run)
+        ious = np.array([iou(a, b) for a, b in zip(masks, ref_masks)])
+        db_err = np.abs(db - ref_db)
+        same_alerts = alerts == ref_alerts
+        print(f"scale {scale:.2f}: {ms:7.2f} ms/frame, IoU mean "
+              f"{ious.mean():.3f} min {ious.min():.3f}, |db| mean "
+              f"{db_err.mean():.2f} max {db_err.max():.2f}, alerts "
+              f"{'match' if same_alerts else alerts}")
+        if same_alerts and ious.mean() >= args.min_iou and scale < recommended:
+            recommended = scale
+        report["scales"].append({
+            "scale": scale, "ms_per_frame": ms,
+            "iou_mean": float(ious.mean()), "iou_min": float(ious.min()),
+            "db_abs_err_mean": float(db_err.mean()),
+            "db_abs_err_max": float(db_err.max()),
+            "alerts": alerts, "alerts_match": same_alerts,
+        })
+
+    print(f"Smallest scale with matching alerts and IoU >= {args.min_iou}: "
+          f"{recommended:.2f}")
+    report["recommended_scale"] = recommended
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,114 @@
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self._reply("220 stub ESMTP ready")
+        mail_from, rcpts = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            cmd = line[:4].upper()
+
+            if server.drop_next > 0 and cmd in ("MAIL", "NOOP"):
+                # simulate the server closing an idle connection
+                server.drop_next -= 1
+                return
+            if cmd in ("EHLO", "HELO"):
+                self._reply("250-stub")
+                self._reply("250 AUTH PLAIN LOGIN")
+            elif cmd == "AUTH":
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].upper() == "LOGIN":
+                    # username and password, each answered with 334 then 235
+                    for prompt in ("VXNlcm5hbWU6", "UGFzc3dvcmQ6"):
+                        self._reply(f"334 {prompt}")
+                        self.rfile.readline()
+                server.logins += 1
+                self._reply("235 Authentication successful")
+            elif cmd == "MAIL":
+                mail_from, rcpts = line[10:].strip(" <>"), []
+                self._reply("250 OK")
+            elif cmd == "RCPT":
+                rcpts.append(line[8:].strip(" <>"))
+                self._reply("250 OK")
+            elif cmd == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw or raw in (b".\r\n", b".\n"):
+                        break
+                    data.append(raw[1:] if raw.startswith(b"..") else raw)
+                with server.lock:
+                    server.messages.append(
+                        (mail_from, rcpts, b"".join(data)))
+                self._reply("250 OK queued")
+            elif cmd in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif cmd == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    # Minimal plain-text SMTP server on localhost for exercising the alert
+    # path without a real mail account. Accepts any login and keeps every
+    # message in `messages` as (mail_from, rcpts, raw_bytes).
+    # Use AlertDispatcher(host, port, use_ssl=False) against it.
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self.drop_next = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="smtp-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    import time
+
+    stub = StubSMTPServer(port=2525).start()
+    print(f"Stub SMTP server listening on 127.0.0.1:{stub.port}")
+    try:
+        while True:
+            time.sleep(1)
+            with stub.lock:
+                while stub.messages:
+                    mail_from, rcpts, data = stub.messages.pop(0)
+                    print(f"Message from {mail_from} to {rcpts}, "
+                          f"{len(data)} bytes")
+    except KeyboardInterrupt:
+        stub.stop()
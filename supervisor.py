@@ -0,0 +1,420 @@
+import argparse
+import datetime
+import json
+import signal
+import threading
+import time
+
+from alerts import AlertDispatcher
+from batching import BatchScheduler
+from capture import CaptureThread
+from diff_log import DiffLogger
+from email_sender import SMTP_HOST, SMTP_PORT
+from mask_engine import create_mask_engine
+from monitor import Monitor
+from regions import Region
+from filament_watcher import FilamentWatcher
+from printer_io import create_driver
+
+BLEND_ALPHA = 0.4
+MINT_BGR = (201, 252, 157)
+ALERT_BGR = (0, 0, 255)
+BOX_THICKNESS = 4
+
+
+class PrinterSource:
+    # One printer: a capture source, its ROI in frame pixels, its own
+    # detection settings and GPIO pins. `regions` (Region.from_config
+    # dicts, also in frame pixels) replaces the single ROI with named
+    # regions and exclusion zones.
+
+    def __init__(
+        self,
+        name,
+        camera,
+        roi=None,
+        sensitivity=30,
+        consecutive_threshold=3,
+        pause_pin=None,
+        filament_pin=None,
+        pause_on_alert=False,
+        priority=0,
+        max_fps=2.0,
+        width=None,
+        height=None,
+        camera_fps=None,
+        fourcc=None,
+        buffer_size=1,
+        regions=None,
+    ):
+        self.name = name
+        self.camera = camera
+        self.roi = tuple(roi) if roi is not None else None
+        self.regions = [Region.from_config(r) for r in regions or ()]
+        if self.roi is None and not self.regions:
+            raise ValueError(f"Printer '{name}' needs a roi or regions")
+        self.sensitivity = sensitivity
+        self.consecutive_threshold = consecutive_threshold
+        self.pause_pin = pause_pin
+        self.filament_pin = filament_pin
+        self.pause_on_alert = pause_on_alert
+        self.priority = priority
+        self.max_fps = max_fps  # per-printer frame budget
+        # read on its own thread, so a printer sampled at max_fps still
+        # gets the newest frame rather than one queued in the driver
+        self.capture = CaptureThread(camera, width, height, camera_fps,
+                                     fourcc, buffer_size)
+        self.frame_seq = None
+        self.frame_ts = None  # capture time of the frame being analysed
+        self.latency_ms = 0.0  # capture to decision, smoothed
+        self.monitor = None
+        self.diff_log = None
+        self.gpio = None  # pin driver, shared by the supervisor
+        self.filament = None  # FilamentWatcher while open
+        self.next_due = 0.0
+        self.frames = 0
+        self.alerts = 0
+        self.db = 0
+        self.frame = None  # last analysed frame, for previews
+        self.filament_present = None
+        self.paused_by_alert = False
+        self.paused_by_filament = False
+        # set while this printer's last frame failed; the others carry on
+        self.degraded = False
+        self.errors = 0
+        self.last_error = None
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(**cfg)
+
+    def open(self, gpio, filament_debounce=0.05):
+        self.gpio = gpio
+        try:
+            self.capture.open()
+        except RuntimeError as e:
+            raise RuntimeError(f"{e} for printer '{self.name}'")
+        print(f"[{self.name}] camera {self.capture.describe()}")
+        self.capture.start()
+        if self.pause_pin is not None:
+            gpio.setup_output(self.pause_pin)
+        if self.filament_pin is not None and not gpio.simulated:
+            # run-outs pause the printer from the watcher's own thread
+            self.filament = FilamentWatcher(
+                gpio, self.filament_pin, self.pause_pin,
+                filament_debounce).start()
+            self.filament.arm()
+        self.apply_pause_state()
+
+    def close(self):
+        self.capture.stop()
+        if self.filament is not None:
+            self.filament.stop()
+            self.filament = None
+
+    def apply_pause_state(self):
+        if self.pause_pin is None:
+            return
+        self.gpio.set_printer_state(
+            not (self.paused_by_alert or self.paused_by_filament),
+            pin=self.pause_pin)
+
+
+class MonitorSupervisor:
+    # Monitors several printers from one process. All Monitors share one
+    # mask engine, so the model is loaded into memory once, and frames are
+    # scheduled round-robin or by priority within each printer's budget.
+
+    def __init__(
+        self,
+        sources,
+        model_name="u2netp",
+        backend="onnx",
+        precision="fp32",
+        schedule="round_robin",
+        roi_only=True,
+        roi_padding=16,
+        infer_scale=1.0,
+        batch_size=1,
+        batch_latency=0.05,
+        on_alert=None,
+        log_dir=None,
+        gpio_driver="auto",
+        filament_debounce=0.05,
+        mask_ema=None,
+        baseline_ema=None,
+        mask_open=0,
+    ):
+        if schedule not in ("round_robin", "priority"):
+            raise ValueError(f"Unknown schedule '{schedule}'")
+        self.sources = list(sources)
+        self.schedule = schedule
+        self.on_alert = on_alert
+        self.gpio = create_driver(gpio_driver)
+        self.filament_debounce = filament_debounce
+        t0 = time.perf_counter()
+        self.engine = create_mask_engine(backend, model_name,
+                                         precision=precision)
+        t1 = time.perf_counter()
+        self.engine.warmup()
+        print(f"Model {model_name} loaded in {t1 - t0:.2f} s, warm-up "
+              f"inference {time.perf_counter() - t1:.2f} s")
+        for src in self.sources:
+            src.monitor = Monitor(
+                src.sensitivity, src.consecutive_threshold, BLEND_ALPHA,
+                MINT_BGR, ALERT_BGR, BOX_THICKNESS, roi_only=roi_only,
+                roi_padding=roi_padding, engine=self.engine,
+                infer_scale=infer_scale, regions=src.regions or None,
+                mask_ema=mask_ema, baseline_ema=baseline_ema,
+                mask_open=mask_open)
+            # one diff log per printer, for tuning its thresholds later
+            src.diff_log = DiffLogger(log_dir, prefix=src.name) \
+                if log_dir else None
+        # batch_size > 1 runs crops from several printers in one forward pass
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = BatchScheduler(
+                self.engine, batch_size, batch_latency)
+        self._rr_index = 0
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls, cfg, on_alert=None):
+        sources = [PrinterSource.from_config(p) for p in cfg["printers"]]
+        return cls(
+            sources,
+            model_name=cfg.get("model_name", "u2netp"),
+            backend=cfg.get("backend", "onnx"),
+            precision=cfg.get("precision", "fp32"),
+            schedule=cfg.get("schedule", "round_robin"),
+            roi_only=cfg.get("roi_only", True),
+            roi_padding=cfg.get("roi_padding", 16),
+            infer_scale=cfg.get("infer_scale", 1.0),
+            batch_size=cfg.get("batch_size", 1),
+            batch_latency=cfg.get("batch_latency", 0.05),
+            on_alert=on_alert,
+            log_dir=cfg.get("log_dir"),
+            gpio_driver=cfg.get("gpio_driver", "auto"),
+            filament_debounce=cfg.get("filament_debounce", 0.05),
+            mask_ema=cfg.get("mask_ema"),
+            baseline_ema=cfg.get("baseline_ema"),
+            mask_open=cfg.get("mask_open", 0),
+        )
+
+    def _next_source(self, now):
+        due = [s for s in self.sources if s.next_due <= now]
+        if not due:
+            return None
+        if self.schedule == "priority":
+            # highest priority first, then whoever has waited longest
+            return max(due, key=lambda s: (s.priority, now - s.next_due))
+        n = len(self.sources)
+        for i in range(n):
+            src = self.sources[(self._rr_index + i) % n]
+            if src.next_due <= now:
+                self._rr_index = (self._rr_index + i + 1) % n
+                return src
+        return None
+
+    def _check_filament(self, src):
+        # debounced changes from the printer's watcher, which has already
+        # pulled the pause pin on a run-out
+        if src.filament is None:
+            return
+        for present, _ in src.filament.events():
+            self._filament_changed(src, present)
+
+    def _filament_changed(self, src, present):
+        src.filament_present = present
+        if not present and not src.paused_by_filament:
+            print(f"[{src.name}] FILAMENT RUN-OUT DETECTED!")
+            src.paused_by_filament = True
+            src.apply_pause_state()
+        elif present and src.paused_by_filament:
+            print(f"[{src.name}] Filament re-detected. Clearing filament pause.")
+            src.paused_by_filament = False
+            src.apply_pause_state()
+
+    def _source_failed(self, src, stage, e):
+        # logged when the error first appears, counted every time
+        error = f"{stage}: {e}"
+        if not src.degraded or error != src.last_error:
+            print(f"[{src.name}] Error during {error}")
+        src.degraded = True
+        src.errors += 1
+        src.last_error = error
+
+    def _handle_results(self, results):
+        for src, frame, alert_triggered, db in results:
+            try:
+                self._handle_result(src, frame, alert_triggered, db)
+            except Exception as e:
+                self._source_failed(src, "result handling", e)
+        if self.batcher is not None:
+            for src, e in self.batcher.errors():
+                self._source_failed(src, "inference", e)
+
+    def _handle_result(self, src, frame, alert_triggered, db):
+        src.degraded = False
+        src.db = db
+        src.frame = frame
+        src.frames += 1
+        if src.frame_ts is not None:
+            latency = (time.perf_counter() - src.frame_ts) * 1000
+            src.latency_ms = latency if not src.latency_ms \
+                else 0.9 * src.latency_ms + 0.1 * latency
+        if src.diff_log is not None:
+            filament = -1 if src.filament_present is None \
+                else int(src.filament_present)
+            src.diff_log.append(time.time(), src.monitor.dp, db,
+                                src.monitor.abnormal_count,
+                                src.monitor.alert, filament)
+        if alert_triggered:
+            src.alerts += 1
+            print(f"[{src.name}] Motion alert triggered by monitor.")
+            if src.pause_on_alert:
+                src.paused_by_alert = True
+                src.apply_pause_state()
+            if self.on_alert is not None:
+                self.on_alert(src, frame, db)
+
+    def step(self):
+        # errors are caught per printer (and per batch), so one bad camera
+        # or frame marks that printer degraded instead of stopping them all
+        for src in self.sources:
+            try:
+                self._check_filament(src)
+            except Exception as e:
+                self._source_failed(src, "filament check", e)
+        now = time.perf_counter()
+        src = self._next_source(now)
+        if src is None:
+            wait = min(s.next_due for s in self.sources) - now
+            if self.batcher is not None:
+                self._handle_results(self.batcher.poll())
+                deadline = self.batcher.time_to_deadline()
+                if deadline is not None:
+                    wait = min(wait, deadline)
+            return wait
+
+        latest = src.capture.latest(src.frame_seq)
+        if latest is None:
+            # no new frame from this camera yet; try again shortly
+            src.next_due = now + 0.01
+            return 0.0
+        src.frame_seq, frame, src.frame_ts = latest
+        src.next_due = now + (1.0 / src.max_fps if src.max_fps else 0.0)
+
+        try:
+            if self.batcher is None:
+                alert_triggered, db = src.monitor.analyze(
+                    frame, src.roi, 1, 1)
+                results = [(src, frame, alert_triggered, db)]
+            else:
+                results = self.batcher.submit(
+                    src.monitor, frame, src.roi, 1, 1, context=src)
+        except Exception as e:
+            self._source_failed(src, "inference", e)
+            results = []
+        self._handle_results(results)
+        return 0.0
+
+    def resume(self, name):
+        for src in self.sources:
+            if src.name == name and src.paused_by_alert:
+                print(f"[{src.name}] Printer resume requested.")
+                src.paused_by_alert = False
+                src.apply_pause_state()
+
+    def run(self):
+        for src in self.sources:
+            src.open(self.gpio, self.filament_debounce)
+        try:
+            while not self._stop.is_set():
+                wait = self.step()
+                if self._recordings_done():
+                    print("All recordings have ended.")
+                    break
+                if wait > 0:
+                    self._stop.wait(wait)
+        finally:
+            for src in self.sources:
+                src.close()
+                if src.diff_log is not None:
+                    src.diff_log.close()
+
+    def _recordings_done(self):
+        # every source is a video file that has ended and been analysed to
+        # its last frame; crops still waiting for a batch are finished off
+        if not all(src.capture.ended
+                   and src.capture.latest(src.frame_seq) is None
+                   for src in self.sources):
+            return False
+        if self.batcher is not None:
+            self._handle_results(self.batcher.flush())
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+
+def email_alert_handler(dispatcher):
+    def on_alert(src, frame, db):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        where = "ROI"
+        if src.monitor.regions is not None:
+            names = src.monitor.regions.triggered
+            where = "region" + ("s " if len(names) > 1 else " ") + \
+                ", ".join(names)
+        body = f"""
+        <html>
+          <body>
+            <h2>3D Printer Alert: Motion Detected ({src.name})</h2>
+            <p>Motion was detected in the monitored {where} at {timestamp}
+               (diff {db:.1f}%).</p>
+            <p><img src="cid:alert_image"></p>
+          </body>
+        </html>
+        """
+        dispatcher.send(
+            f"3D Printer Alert: Motion Detected ({src.name})", body, frame)
+    return on_alert
+
+
+def alerts_from_config(config):
+    # Returns (dispatcher, on_alert) for the optional "email" section, or
+    # (None, None) when alerts are not configured.
+    email = config.get("email")
+    if not email:
+        return None, None
+    dispatcher = AlertDispatcher(
+        host=email.get("host", SMTP_HOST), port=email.get("port", SMTP_PORT),
+        use_ssl=email.get("use_ssl", True))
+    dispatcher.start()
+    dispatcher.configure(
+        email["sender"], email["password"], email["recipient"])
+    return dispatcher, email_alert_handler(dispatcher)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Monitor several printers from one process.")
+    parser.add_argument("config", help="JSON file with a 'printers' list")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    dispatcher, on_alert = alerts_from_config(config)
+
+    supervisor = MonitorSupervisor.from_config(config, on_alert=on_alert)
+    # a service stop (SIGTERM) or hangup ends the run like Ctrl+C, so the
+    # diff logs are flushed and the cameras and pins released
+    for sig in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(sig, lambda signum, frame: supervisor.stop())
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        supervisor.stop()
+    finally:
+        if dispatcher is not None:
+            dispatcher.stop()
@@ -0,0 +1,128 @@
+import time
+
+import numpy as np
+import pytest
+
+from alerts import AlertDispatcher
+from smtp_stub import StubSMTPServer
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def stub():
+    server = StubSMTPServer().start()
+    yield server
+    server.stop()
+
+
+def dispatcher_for(stub, **kwargs):
+    dispatcher = AlertDispatcher("127.0.0.1", stub.port, use_ssl=False,
+                                 **kwargs)
+    dispatcher.configure("monitor@example.com", "secret", "me@example.com")
+    return dispatcher
+
+
+def test_alert_is_delivered(stub):
+    dispatcher = dispatcher_for(stub)
+    dispatcher.start()
+    try:
+        assert dispatcher.send("Printer alert", "<p>motion</p>",
+                               np.zeros((48, 64, 3), np.uint8))
+        assert wait_for(lambda: dispatcher.sent == 1)
+    finally:
+        dispatcher.stop()
+    (mail_from, rcpts, data), = stub.messages
+    assert mail_from == "monitor@example.com"
+    assert rcpts == ["me@example.com"]
+    assert b"Subject: Printer alert" in data
+    assert b"alert_image.jpg" in data
+    assert stub.logins == 1
+
+
+def test_connection_is_kept_between_alerts(stub):
+    dispatcher = dispatcher_for(stub)
+    dispatcher.start()
+    try:
+        for i in range(3):
+            dispatcher.send(f"Alert {i}", "body")
+        assert wait_for(lambda: dispatcher.sent == 3)
+    finally:
+        dispatcher.stop()
+    assert len(stub.messages) == 3
+    assert stub.connections == 1
+
+
+def test_reconnects_after_the_server_drops_the_connection(stub):
+    dispatcher = dispatcher_for(stub)
+    dispatcher.start()
+    try:
+        dispatcher.send("First", "body")
+        assert wait_for(lambda: dispatcher.sent == 1)
+        stub.drop_next = 1  # the idle connection is closed server-side
+        dispatcher.send("Second", "body")
+        assert wait_for(lambda: dispatcher.sent == 2)
+    finally:
+        dispatcher.stop()
+    assert [m[2].count(b"Subject: Second") for m in stub.messages] == [0, 1]
+    assert stub.connections == 2
+    assert dispatcher.failed == 0
+
+
+def test_retries_with_backoff(stub):
+    # the reconnect inside SmtpConnection is dropped as well, so the first
+    # attempt fails and the dispatcher has to back off and try again
+    stub.drop_next = 2
+    dispatcher = dispatcher_for(stub, backoff=0.05)
+    dispatcher.start()
+    try:
+        t0 = time.monotonic()
+        dispatcher.send("Alert", "body")
+        assert wait_for(lambda: dispatcher.sent == 1)
+        assert time.monotonic() - t0 >= 0.05
+    finally:
+        dispatcher.stop()
+    assert len(stub.messages) == 1
+    assert stub.connections == 3
+    assert dispatcher.failed == 0
+
+
+def test_gives_up_after_max_retries():
+    server = StubSMTPServer().start()
+    port = server.port
+    server.stop()  # nothing listening any more
+    dispatcher = AlertDispatcher("127.0.0.1", port, use_ssl=False,
+                                 max_retries=3, backoff=0.01)
+    dispatcher.configure("monitor@example.com", "secret", "me@example.com")
+    dispatcher.start()
+    try:
+        dispatcher.send("Alert", "body")
+        assert wait_for(lambda: dispatcher.failed == 1)
+    finally:
+        dispatcher.stop()
+    assert dispatcher.sent == 0
+
+
+def test_full_queue_drops_new_alerts(stub):
+    # configure() takes one slot; with the worker not started nothing drains
+    dispatcher = dispatcher_for(stub, max_queue=3)
+    assert dispatcher.send("Alert 0", "body")
+    assert dispatcher.send("Alert 1", "body")
+    assert not dispatcher.send("Alert 2", "body")
+    assert dispatcher.dropped == 1
+
+    dispatcher.start()
+    try:
+        assert wait_for(lambda: dispatcher.sent == 2)
+    finally:
+        dispatcher.stop()
+    subjects = [m[2] for m in stub.messages]
+    assert len(subjects) == 2
+    assert not any(b"Subject: Alert 2" in s for s in subjects)
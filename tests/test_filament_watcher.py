@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+from filament_watcher import FilamentWatcher, measure_pause_latency
+from printer_io import FILAMENT_SENSOR_PIN, PRINTER_PAUSE_PIN, SimulatedDriver
+
+SENSOR = FILAMENT_SENSOR_PIN
+PAUSE = PRINTER_PAUSE_PIN
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def pauses(driver):
+    return [ts for pin, level, ts in driver.writes if pin == PAUSE and level]
+
+
+@pytest.fixture
+def watched():
+    # an armed watcher on a loaded sensor (LOW); yields (driver, watcher)
+    watchers = []
+
+    def make(**kwargs):
+        driver = SimulatedDriver({SENSOR: False})
+        watcher = FilamentWatcher(driver, **kwargs).start()
+        watchers.append(watcher)
+        assert wait_for(lambda: watcher.present is True)
+        watcher.arm()
+        watcher.events()
+        return driver, watcher
+
+    yield make
+    for watcher in watchers:
+        watcher.stop()
+
+
+def test_run_out_pauses_after_debounce(watched):
+    driver, watcher = watched(debounce=0.05)
+    t0 = time.perf_counter()
+    driver.set_input(SENSOR, True)
+    assert wait_for(lambda: pauses(driver))
+    assert 0.05 <= pauses(driver)[0] - t0 < 0.25
+    assert wait_for(lambda: watcher.present is False)
+    (present, latency), = watcher.events()
+    assert present is False and latency >= 0.05
+
+
+def test_chatter_shorter_than_debounce_is_ignored(watched):
+    driver, watcher = watched(debounce=0.05)
+    for _ in range(5):
+        driver.set_input(SENSOR, True)
+        time.sleep(0.002)
+        driver.set_input(SENSOR, False)
+        time.sleep(0.002)
+    time.sleep(0.2)
+    assert watcher.edges == 10
+    assert pauses(driver) == []
+    assert watcher.present is True
+    assert watcher.events() == []
+
+
+def test_bouncing_line_is_decided_after_max_settle(watched):
+    # edges keep coming faster than the debounce window, so only max_settle
+    # ends the wait
+    driver, watcher = watched(debounce=0.05, max_settle=0.2)
+    t0 = time.perf_counter()
+    driver.set_input(SENSOR, True)
+    callback = driver._callbacks[SENSOR]
+    while time.perf_counter() - t0 < 1.0 and not pauses(driver):
+        callback()
+        time.sleep(0.01)
+    assert pauses(driver)
+    assert 0.2 <= pauses(driver)[0] - t0 < 0.5
+
+
+def test_missed_edge_is_caught_by_polling(watched):
+    driver, watcher = watched(debounce=0.05, poll_interval=0.1)
+    edges = watcher.edges
+    t0 = time.perf_counter()
+    driver.levels[SENSOR] = True  # no callback, as if the edge was lost
+    assert wait_for(lambda: pauses(driver), timeout=1.0)
+    assert pauses(driver)[0] - t0 < 0.3
+    assert watcher.edges == edges
+    assert watcher.events() == [(False, 0.0)]
+
+
+def test_run_out_while_disarmed_does_not_pause(watched):
+    driver, watcher = watched(debounce=0.01)
+    watcher.arm(False)
+    driver.set_input(SENSOR, True)
+    assert wait_for(lambda: watcher.present is False)
+    assert pauses(driver) == []
+    # arming with the sensor already empty pauses straight away
+    watcher.arm()
+    assert wait_for(lambda: pauses(driver))
+
+
+def test_pause_latency_on_simulated_driver():
+    latencies = measure_pause_latency(trials=10, debounce=0.01, gap=0.05)
+    assert len(latencies) == 10
+    assert latencies.min() >= 0.01
+    assert latencies.max() < 0.1
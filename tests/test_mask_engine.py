@@ -0,0 +1,90 @@
+import ctypes
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from mask_engine import MODEL_SPECS, OnnxMaskEngine, RembgMaskEngine
+
+rembg_sessions = pytest.importorskip("rembg.sessions")
+
+
+def _forward(x):
+    # stand-in for the network: nonlinear in the input, so a wrong mean or
+    # std survives the min-max normalisation of the output
+    return np.tanh(4 * x).sum(axis=1, keepdims=True).astype(np.float32)
+
+
+class _Binding:
+    def bind_cpu_input(self, name, tensor):
+        self.input = tensor
+
+    def bind_output(self, name, device, device_id, dtype, shape, ptr):
+        self.output = np.ctypeslib.as_array(
+            ctypes.cast(ptr, ctypes.POINTER(ctypes.c_float)), shape)
+
+
+class _FakeInnerSession:
+    # the parts of onnxruntime.InferenceSession both backends use; records
+    # every input tensor it is run on
+    def __init__(self, size):
+        self._inputs = [SimpleNamespace(name="input", shape=[1, 3, size, size])]
+        self._outputs = [SimpleNamespace(name="output")]
+        self.fed = []
+
+    def get_inputs(self):
+        return self._inputs
+
+    def get_outputs(self):
+        return self._outputs
+
+    def run(self, output_names, feed):
+        self.fed.append(feed["input"].copy())
+        return [_forward(feed["input"])]
+
+    def io_binding(self):
+        return _Binding()
+
+    def run_with_iobinding(self, binding):
+        self.fed.append(binding.input.copy())
+        binding.output[...] = _forward(binding.input)
+
+
+def _rembg_session(model_name, inner):
+    # the real rembg session class, with the fake graph in place of the
+    # downloaded model
+    cls = rembg_sessions.sessions[model_name]
+    session = cls.__new__(cls)
+    session.model_name = model_name
+    session.inner_session = inner
+    return session
+
+
+def _frame():
+    # smooth gradients and a soft blob, so the two resize filters agree
+    h, w = 240, 320
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    blob = np.exp(-((x - 200) ** 2 + (y - 110) ** 2) / (2 * 40.0 ** 2))
+    frame = np.dstack([x / w * 200 + 30, y / h * 180 + 40, blob * 220 + 20])
+    return frame.astype(np.uint8)
+
+
+@pytest.mark.parametrize("model_name", sorted(MODEL_SPECS))
+def test_onnx_backend_matches_rembg(model_name):
+    size = MODEL_SPECS[model_name][2]
+    frame = _frame()
+
+    inner = _FakeInnerSession(size)
+    reference = RembgMaskEngine(
+        model_name, session=_rembg_session(model_name, inner)).alpha(frame)
+    engine = OnnxMaskEngine(
+        model_name, session=SimpleNamespace(inner_session=inner))
+    mask = engine.alpha(frame)
+
+    rembg_input, onnx_input = inner.fed
+    assert onnx_input.shape == rembg_input.shape
+    # same mean and std per channel, up to the resampling filter
+    np.testing.assert_allclose(onnx_input.mean(axis=(0, 2, 3)),
+                               rembg_input.mean(axis=(0, 2, 3)), atol=0.005)
+    assert mask.shape == reference.shape
+    assert np.abs(mask.astype(int) - reference.astype(int)).mean() < 2.0